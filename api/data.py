@@ -1,11 +1,17 @@
 import logging
+import threading
 import time
 from dataclasses import dataclass, field
+from typing import Tuple, Dict, List, Callable, Type
 from requests.exceptions import ConnectionError
 
-from spotipy import Spotify
+import multitasking
+from spotipy import Spotify, SpotifyException
 
-from constants import RAPID_REFRESH_RATE, SLOW_REFRESH_RATE
+from api.events import Event, TrackChanged, PlayStateChanged, ProgressJumped, DeviceChanged
+from api.limiter import RateLimiter
+from constants import RAPID_REFRESH_RATE, SLOW_REFRESH_RATE, QUEUE_REFRESH_RATE, PREFETCH_DEPTH, PROGRESS_TOLERANCE
+from imaging.cache import art_cache
 from model.track import Track
 from model.user import User
 
@@ -13,14 +19,21 @@ from model.user import User
 @dataclass
 class Data:
     sp: Spotify
+    art_size: Tuple[int, int] = None  # album art size to prefetch, None to disable
+    limiter: RateLimiter = None  # shared with other accounts' Data instances
     user: User = field(init=False)
     is_playing: bool = False
     track: Track = None
     prev_track: Track = None
+    progress: int = 0  # [ms]
+    device: str = None
     last_updated: float = None
     refresh_rate: int = RAPID_REFRESH_RATE  # change based on activity
     new_data: bool = False
     timeout: bool = False
+    queue_updated: float = 0
+    subscribers: Dict[Type[Event], List[Callable[[Event], None]]] = field(default_factory=dict)
+    lock: threading.RLock = field(default_factory=threading.RLock, repr=False)  # renderers & poller may update
 
     def __post_init__(self):
         logging.debug('Initializing data...')
@@ -33,26 +46,113 @@ class Data:
         :param force: (bool) force update
         :return: bool to indicate if new data was fetched
         """
-        if force or self.needs_update():
-            self.last_updated = time.time()
-            logging.debug('Checking for new data...')
+        with self.lock:
+            if force or self.needs_update():
+                elapsed = time.time() - self.last_updated if self.last_updated else 0
+                self.last_updated = time.time()
+                logging.debug('Checking for new data...')
 
-            data = self.sp.currently_playing()
+                try:
+                    if self.limiter:
+                        self.limiter.wait()
+                    data = self.sp.current_playback()
+                except SpotifyException as e:
+                    if e.http_status == 429:
+                        self.rate_limited(e)
+                    else:
+                        logging.error(f'Could not get playback state: {e}')  # Try again on the next update
+                    return False
+                was_playing, prev_progress, prev_device = self.is_playing, self.progress, self.device
 
+                try:
+                    self.is_playing = bool(data['is_playing'])
+                    self.progress = data['progress_ms'] or 0
+                    self.device = data['device']['name']
+                    self.prev_track = self.track
+                    if self.track is None or data['item']['uri'] != self.track.uri:  # Same track: nothing to build
+                        self.now_playing(data['item'])
+                    for event in self.diff(was_playing, prev_progress, prev_device, elapsed):
+                        self.dispatch(event)
+                    if self.prev_track:
+                        return self.prev_track.uri != self.track.uri  # new data
+                except TypeError:
+                    self.is_playing = False
+                    if was_playing:
+                        self.dispatch(PlayStateChanged(False))
+                    logging.warning('Stopped playback')
+                except ConnectionError:
+                    return self.update(force=True)
+                finally:
+                    if self.needs_prefetch():
+                        self.queue_updated = time.time()
+                        self.prefetch()
+                self.refresh_rate = RAPID_REFRESH_RATE if self.is_playing else SLOW_REFRESH_RATE
+                return True  # just initialized
+            return False  # no new data
+
+    def rate_limited(self, e: SpotifyException):
+        """
+        Postpone the next update (and other accounts' if sharing a limiter) as long as Spotify asks to
+        :param e: (SpotifyException) 429 Too Many Requests exception
+        """
+        retry_after = (e.headers or {}).get('Retry-After', '')
+        retry_after = int(retry_after) if retry_after.isdigit() else self.refresh_rate
+        if self.limiter:
+            self.limiter.backoff(retry_after)
+        else:
+            logging.warning(f'Rate limited, retrying in {retry_after}s')
+        self.last_updated = time.time() + retry_after - self.refresh_rate
+
+    def diff(self, was_playing: bool, prev_progress: int, prev_device: str, elapsed: float) -> List[Event]:
+        """
+        Compare the current playback state against the previous one
+        :param was_playing: (bool) previous play state
+        :param prev_progress: (int) previous track progress [ms]
+        :param prev_device: (str) previous device name
+        :param elapsed: (float) seconds since previous state was fetched
+        :return: (list) Events describing the changes
+        """
+        events = []
+
+        # Progress range expected if nothing happened; it can be anywhere in between if play state changed
+        low = high = prev_progress
+        if was_playing or self.is_playing:
+            high += int(elapsed * 1000)
+            if was_playing and self.is_playing:
+                low = high
+
+        if self.prev_track is None or self.prev_track.uri != self.track.uri:
+            events.append(TrackChanged(self.track, self.prev_track))
+        elif self.progress < low - PROGRESS_TOLERANCE and self.progress <= elapsed * 1000 + PROGRESS_TOLERANCE:
+            events.append(TrackChanged(self.track, self.prev_track, replay=True))  # Restarted since last update
+        elif not low - PROGRESS_TOLERANCE <= self.progress <= high + PROGRESS_TOLERANCE:
+            events.append(ProgressJumped(self.progress, high))
+
+        if was_playing != self.is_playing:
+            events.append(PlayStateChanged(self.is_playing))
+        if prev_device != self.device:
+            events.append(DeviceChanged(self.device, prev_device))
+        return events
+
+    def subscribe(self, event_type: Type[Event], callback: Callable[[Event], None]):
+        """
+        Register a callback to be called with every event of the given type
+        :param event_type: (type) Event subclass
+        :param callback: (Callable) function taking the event as its only argument
+        """
+        self.subscribers.setdefault(event_type, []).append(callback)
+
+    def dispatch(self, event: Event):
+        """
+        Call subscribers of the event's type
+        :param event: (Event) Event instance
+        """
+        logging.debug(f'Event: {event}')
+        for callback in self.subscribers.get(type(event), []):
             try:
-                self.is_playing = bool(data['is_playing'])
-                self.prev_track = self.track
-                self.now_playing(data['item'])
-                if self.prev_track:
-                    return self.prev_track.id != self.track.id  # new data
-            except TypeError:
-                self.is_playing = False
-                logging.warning('Stopped playback')
-            except ConnectionError:
-                return self.update(force=True)
-            self.refresh_rate = RAPID_REFRESH_RATE if self.is_playing else SLOW_REFRESH_RATE
-            return True  # just initialized
-        return False  # no new data
+                callback(event)
+            except Exception:
+                logging.exception(f'Error handling {type(event).__name__}')
 
     def get_user(self) -> User:
         """
@@ -71,14 +171,44 @@ class Data:
         Get user's currently playing track
         :param track: (dict) data dictionary
         """
+        artists = track['album']['artists'] or track['artists']  # Local files have no album artists
+        images = track['album']['images']  # Nor album art
         self.track = Track(track['id'],
                            track['name'],
-                           track['album']['artists'][0]['name'],
+                           artists[0]['name'] if artists else '',
                            track['album']['name'],
-                           track['album']['images'][0]['url'],
+                           images[0]['url'] if images else None,
                            track['duration_ms'],
                            track['uri'])
 
+    @multitasking.task
+    def prefetch(self):
+        """
+        Prefetch album art & palettes of the next tracks in the user's queue into the art cache
+        """
+        try:
+            if self.limiter:
+                self.limiter.wait()
+            queue = self.sp.queue()['queue'][:PREFETCH_DEPTH]
+        except (SpotifyException, ConnectionError):
+            logging.warning('Could not get queue')
+            return
+
+        try:
+            urls = [item['album']['images'][0]['url'] for item in queue
+                    if item.get('album') and item['album']['images']]  # Episodes have no album
+            logging.debug(f'Prefetching {len(urls)} upcoming track(s)')
+            art_cache.prefetch(urls, self.art_size)
+        except Exception:
+            logging.exception('Could not prefetch upcoming tracks')
+
+    def needs_prefetch(self) -> bool:
+        """
+        Determine if the queue should be prefetched i.e. playing & 60s have passed since last prefetch
+        :return: bool to indicate if prefetch is needed
+        """
+        return bool(self.art_size) and self.is_playing and time.time() - self.queue_updated >= QUEUE_REFRESH_RATE
+
     def needs_update(self) -> bool:
         """
         Determine if update is needed i.e. 20s have passed since last update
@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+
+from model.track import Track
+
+
+@dataclass(frozen=True)
+class Event:
+    """Base playback state change event"""
+
+
+@dataclass(frozen=True)
+class TrackChanged(Event):
+    """A different track started playing, or the same one restarted (replay)"""
+    track: Track
+    prev_track: Track
+    replay: bool = False
+
+
+@dataclass(frozen=True)
+class PlayStateChanged(Event):
+    """Playback was paused or resumed"""
+    is_playing: bool
+
+
+@dataclass(frozen=True)
+class ProgressJumped(Event):
+    """Progress moved away from where it was expected to be, i.e. the user seeked"""
+    progress: int  # [ms]
+    expected: int  # [ms]
+
+
+@dataclass(frozen=True)
+class DeviceChanged(Event):
+    """Playback was transferred to another device"""
+    device: str
+    prev_device: str
@@ -0,0 +1,41 @@
+import logging
+import threading
+import time
+
+from constants import API_MIN_INTERVAL
+
+
+class RateLimiter:
+    """
+    Spaces out Spotify API calls shared by several pollers, and holds all of them back when rate limited
+
+    Arguments:
+        interval (float):       Minimum seconds between calls
+
+    Attributes:
+        next_call (float):      Earliest time the next call can be made
+    """
+    def __init__(self, interval: float = API_MIN_INTERVAL):
+        self.interval: float = interval
+        self.next_call: float = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block until a call can be made, reserving the following slot for the next caller
+        """
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_call)
+            self.next_call = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def backoff(self, seconds: float):
+        """
+        Hold back every caller after Spotify responded with 429 Too Many Requests
+        :param seconds: (float) Retry-After delay
+        """
+        logging.warning(f'Rate limited, holding API calls for {seconds}s')
+        with self.lock:
+            self.next_call = max(self.next_call, time.time() + seconds)
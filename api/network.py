@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Coroutine
+
+from constants import NETWORK_WORKERS, NETWORK_TIMEOUT, NETWORK_CHUNK_SIZE
+from utils import session
+
+
+class Network:
+    """
+    asyncio event loop on a dedicated thread, so polls & downloads run concurrently rather than one after the other.
+    Requests run on the shared session's connection pool in an executor; downloads are streamed, so a cancelled or
+    timed out download stops between chunks instead of running to completion.
+
+    Arguments:
+        workers (int):          Maximum concurrent requests
+        timeout (float):        Seconds before a request is abandoned
+
+    Attributes:
+        loop (AbstractEventLoop):   Event loop, None while not started
+    """
+    def __init__(self, workers: int = NETWORK_WORKERS, timeout: float = NETWORK_TIMEOUT):
+        self.workers: int = workers
+        self.timeout: float = timeout
+        self.loop: asyncio.AbstractEventLoop = None
+        self.executor: ThreadPoolExecutor = None
+        self.thread: threading.Thread = None
+
+    @property
+    def running(self) -> bool:
+        return self.loop is not None
+
+    def start(self):
+        if self.running:
+            return
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='network')
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.executor)
+        self.thread = threading.Thread(target=self.loop.run_forever, name='network', daemon=True)
+        self.thread.start()
+        logging.debug('Network loop started')
+
+    def stop(self):
+        if self.running:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.executor.shutdown(wait=False)
+            self.loop = None
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """
+        Schedule a coroutine on the event loop from another thread
+        :param coroutine: (Coroutine) Coroutine to run
+        :return: (Future) Future to wait on or cancel
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def fetch(self, url: str) -> bytes:
+        """
+        Download a URL, giving up after the timeout
+        :param url: (str) URL
+        :return: (bytes) Response content, None if the request failed
+        """
+        cancelled = threading.Event()
+        try:
+            return await asyncio.wait_for(self.loop.run_in_executor(None, self.download, url, cancelled),
+                                          self.timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            cancelled.set()  # Stop the download thread as well
+            raise
+
+    def download(self, url: str, cancelled: threading.Event) -> bytes:
+        """
+        Stream a URL's content, stopping early if cancelled
+        :param url: (str) URL
+        :param cancelled: (threading.Event) Set to stop downloading
+        :return: (bytes) Response content, None if the request failed or was cancelled
+        """
+        with session.get(url, stream=True, timeout=self.timeout) as response:
+            if not response.ok:
+                logging.error(f'Could not get {url}')
+                return None
+            chunks = []
+            for chunk in response.iter_content(NETWORK_CHUNK_SIZE):
+                if cancelled.is_set():
+                    logging.debug(f'Cancelled download of {url}')
+                    return None
+                chunks.append(chunk)
+            return b''.join(chunks)
+
+    async def poll(self, data):
+        """
+        Keep data up to date, concurrently with rendering & downloads
+        :param data: (api.Data) Data instance, updated whenever it needs to
+        """
+        while not data.timeout:
+            try:
+                await self.loop.run_in_executor(None, data.update)
+            except Exception:
+                logging.exception('Could not update data')
+            await asyncio.sleep(1)
+
+
+network = Network()
@@ -1,29 +1,70 @@
 import configparser
+import glob
+import os
+from typing import List, Tuple
 
 from spotipy import Spotify, SpotifyOAuth
 
-from constants import CONFIG_FILE
+from constants import CONFIG_FILE, LAYOUT_FILE
+from utils import session
 
 config = configparser.ConfigParser()
 config.read(CONFIG_FILE)
-config = config['spotify']
 
-CLIENT_ID = config.get('client_id')
-CLIENT_SECRET = config.get('client_secret')
-REDIRECT_URI = config.get('redirect_uri')
 SCOPES = [
     'user-read-currently-playing',
+    'user-read-playback-state',
     'user-read-private'
 ]
 
 
-def oauth() -> Spotify:
+def accounts() -> List[str]:
+    """
+    Get the config sections of Spotify accounts, i.e. [spotify] and any [spotify.<name>]
+    :return: (list) Section names
+    """
+    return [section for section in config.sections() if section == 'spotify' or section.startswith('spotify.')]
+
+
+def oauth(account: str = 'spotify') -> Spotify:
     """
     Create Spotify instance with Spotify's OAuth manager.
+    :param account: (str) Account's config section
     :return: Spotify instance
     """
-    return Spotify(oauth_manager=SpotifyOAuth(client_id=config.get('client_id'),
-                                              client_secret=config.get('client_secret'),
-                                              redirect_uri=config.get('redirect_uri'),
+    section = config[account]
+    return Spotify(oauth_manager=SpotifyOAuth(client_id=section.get('client_id'),
+                                              client_secret=section.get('client_secret'),
+                                              redirect_uri=section.get('redirect_uri'),
                                               scope=','.join(SCOPES),
-                                              open_browser=False))
+                                              cache_path='.cache' + account[len('spotify'):].replace('.', '-'),
+                                              open_browser=False),
+                   requests_session=session)
+
+
+def viewport(account: str, width: int, height: int) -> Tuple[int, int, int, int]:
+    """
+    Get the matrix region an account is shown in, e.g. viewport=64,0,64,32
+    :param account: (str) Account's config section
+    :param width: (int) Matrix width
+    :param height: (int) Matrix height
+    :return: (int, int, int, int) x, y, width & height. Defaults to the whole matrix
+    :exception ValueError: If the region is malformed, doesn't fit in the matrix or has no layout for its size
+    """
+    value = config[account].get('viewport')
+    region = (0, 0, width, height)
+    if value:
+        try:
+            region = tuple(int(number) for number in value.split(','))
+        except ValueError:
+            region = ()
+        if len(region) != 4:
+            raise ValueError(f'[{account}] viewport must be x,y,width,height, got {value!r}')
+
+    x, y, w, h = region
+    if x < 0 or y < 0 or w <= 0 or h <= 0 or x + w > width or y + h > height:
+        raise ValueError(f'[{account}] viewport {x},{y},{w},{h} does not fit in the {width}x{height} matrix')
+    if not os.path.isfile(LAYOUT_FILE.format(w, h)):
+        layouts = sorted(os.path.basename(layout) for layout in glob.glob(LAYOUT_FILE.format('*', '*')))
+        raise ValueError(f'[{account}] there is no layout for a {w}x{h} region, available layouts: {layouts}')
+    return region
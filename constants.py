@@ -1,13 +1,68 @@
 RAPID_REFRESH_RATE = 10  # seconds
 SLOW_REFRESH_RATE = 60  # seconds
+PROGRESS_TOLERANCE = 3000  # ms, drift allowed before a seek is reported
+API_MIN_INTERVAL = 1  # seconds between API calls of different accounts
+
+NETWORK_WORKERS = 4  # concurrent requests
+NETWORK_TIMEOUT = 10  # seconds
+ART_FETCH_TIMEOUT = 30  # seconds to wait for album art being fetched by another thread
+NETWORK_CHUNK_SIZE = 16 * 1024  # bytes read between cancellation checks
+HTTP_RETRIES = 3  # retries of failed connections & 5xx responses
 
 # params: width (int), height (int)
 LAYOUT_FILE = 'matrix/w{}h{}.json'
 
 SCROLL_SPEED = 0.5  # seconds
+MAX_SCROLL_SPEED = 2  # seconds, slowest scrolling while overloaded
+SCROLL_PAUSE = 2.5  # seconds, pause when scrolling changes direction
+FRAME_BUDGET = 0.1  # seconds, average render time per animation frame
+PACING_INTERVAL = 5  # seconds between frame pacing checks
+PACING_MAX_LOAD = 0.9  # load average per core
+PACING_MAX_TEMPERATURE = 75  # °C, below the Raspberry Pi's 80°C soft throttling
+THERMAL_FILE = '/sys/class/thermal/thermal_zone0/temp'
 INACTIVITY_TIMEOUT = 30 * 60  # 30 minutes
 
+ANALYSIS_SIZE = (100, 100)  # px, image size used for color analysis
+IMAGE_POOL_WORKERS = 3  # max worker processes for image analysis
+
+ART_CACHE_BYTES = 2 * 1024 * 1024  # in-memory album art cache size
+CACHE_DIR = 'cache'
+ART_CACHE_DIR = 'cache/art'
+ART_CACHE_DISK_BYTES = 50 * 1024 * 1024  # on-disk album art cache size
+PALETTE_CACHE_FILE = 'cache/palettes.bin'
+PALETTE_CACHE_SIZE = 5000  # palettes
+QUEUE_REFRESH_RATE = 60  # seconds
+PREFETCH_DEPTH = 3  # upcoming tracks to prefetch
+PREFETCH_BYTES = 1024 * 1024  # max bytes downloaded per prefetch
+PREFETCH_CPU_TIME = 2  # max seconds spent decoding & analyzing per prefetch
+
 # params: background color (hex), code color (name), URI
 SPOTIFY_CODE_URL = 'https://scannables.scdn.co/uri/plain/png/{}/{}/640/{}'
 
 CONFIG_FILE = 'app.ini'
+
+LOG_FILE = 'now-playing.log'
+LOG_QUEUE_SIZE = 1000  # records waiting to be written, further records are dropped
+
+PROFILE_DIR = 'profile'
+PROFILE_INTERVAL = 0.05  # seconds between stack samples
+PROFILE_DUMP_INTERVAL = 10 * 60  # 10 minutes
+PROFILE_DUMPS = 12  # dumps kept on disk
+PROFILE_TOP_ALLOCATIONS = 25  # allocation diffs per dump
+PROFILE_TRACEBACK_DEPTH = 10  # frames stored per allocation
+
+HISTORY_DIR = 'history'
+FRAME_HISTORY_BYTES = 1024 * 1024  # memory reserved for past frames
+FRAME_HISTORY_LENGTH = 300  # frames
+FRAME_HISTORY_BACKLOG = 8  # frames waiting to be compressed, older ones are dropped
+
+SOAK_TRACK_LENGTH = 30  # simulated seconds
+SOAK_ALBUMS = 200  # distinct album covers
+SOAK_SAMPLE_INTERVAL = 10  # seconds
+SOAK_WARMUP = 0.2  # share of samples ignored
+# max growth over the soak test: float = fraction of initial value, int = absolute
+SOAK_TOLERANCE = {'rss': 0.1, 'threads': 2, 'fds': 2, 'latency': 0.5}
+
+# params: cache key (str)
+PROFILE_CACHE_FILE = 'cache/profile/{}.png'
+PROFILE_CACHE_SIZE = 8  # profile screens kept on disk
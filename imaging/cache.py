@@ -0,0 +1,362 @@
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, TimeoutError
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Tuple
+
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+from requests import RequestException
+
+from api.network import network
+from constants import ART_CACHE_BYTES, ART_CACHE_DIR, ART_CACHE_DISK_BYTES, PREFETCH_BYTES, PREFETCH_CPU_TIME, \
+    NETWORK_TIMEOUT, ART_FETCH_TIMEOUT
+from imaging.pool import image_pool
+from matrix.pacing import frame_pacer
+from utils import Palette, session
+
+
+@dataclass
+class Artwork:
+    """Album art & the palette to render over it"""
+    image: Image
+    palette: Palette
+    downloaded: int = 0  # [bytes]
+    analysis_time: float = 0  # [s] decoding & color analysis
+
+
+def image_id(url: str) -> str:
+    """
+    Get an image's id from its URL, e.g. https://i.scdn.co/image/<id>
+    :param url: (str) URL to image
+    :return: (str) Image id, or the URL's hash if it doesn't end with one
+    """
+    name = url.rstrip('/').rsplit('/', 1)[-1]
+    if re.fullmatch(r'[A-Za-z0-9_-]+', name):
+        return name
+    return hashlib.sha1(url.encode()).hexdigest()
+
+
+def artwork_path(url: str, size: Tuple[int, int], directory: str = ART_CACHE_DIR) -> str:
+    """
+    Get the on-disk cache location of an image
+    :param url: (str) URL to image
+    :param size: (int, int) Image's maximum width and height
+    :param directory: (str) Cache directory
+    :return: (str) PNG file path
+    """
+    return os.path.join(directory, f'{size[0]}x{size[1]}', f'{image_id(url)}.png')
+
+
+def read_artwork(url: str, size: Tuple[int, int], directory: str = ART_CACHE_DIR) -> Artwork:
+    """
+    Read artwork from the on-disk cache: the resized image as PNG, with its palette in a text chunk.
+    Reading it marks it as recently used, as its modification time is what disk pruning goes by.
+    :param url: (str) URL to image
+    :param size: (int, int) Image's maximum width and height
+    :param directory: (str) Cache directory
+    :return: (Artwork) Artwork instance, None if not cached
+    """
+    path = artwork_path(url, size, directory)
+    if os.path.isfile(path):
+        try:
+            with Image.open(path) as file:
+                palette = json.loads(file.text['palette'])
+                artwork = Artwork(file.convert('RGB'),
+                                  Palette(tuple(palette['background']),
+                                          tuple(palette['primary']),
+                                          tuple(palette['secondary']),
+                                          palette['light']))
+        except (OSError, KeyError, ValueError):
+            logging.exception(f'Invalid cached artwork at {path}')
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            logging.warning(f'Could not mark cached artwork at {path} as used')
+        return artwork
+
+
+def write_artwork(url: str, size: Tuple[int, int], artwork: Artwork, directory: str = ART_CACHE_DIR):
+    """
+    Write artwork to the on-disk cache
+    :param url: (str) URL to image
+    :param size: (int, int) Image's maximum width and height
+    :param artwork: (Artwork) Artwork instance
+    :param directory: (str) Cache directory
+    """
+    path = artwork_path(url, size, directory)
+    info = PngInfo()
+    info.add_text('palette', json.dumps(asdict(artwork.palette)))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        artwork.image.save(path, pnginfo=info)
+    except OSError:
+        logging.exception(f'Could not cache artwork at {path}')
+
+
+class ArtCache:
+    """
+    LRU cache of album art & palettes, in memory (bounded by the decoded images' size) & on disk (bounded by the PNG
+    files' size). Concurrent requests for the same image are fetched & analyzed once.
+
+    Arguments:
+        max_bytes (int):            Maximum size of cached images in memory
+        directory (str):            On-disk cache directory
+        max_disk_bytes (int):       Maximum size of cached images on disk
+
+    Attributes:
+        entries (OrderedDict):      Artwork instances by (url, size), least recently used first
+        pending (dict):             Events set once an in-flight fetch completes, by (url, size)
+        downloads (dict):           In-flight downloads on the network loop, by (url, size)
+        bytes (int):                Current size of cached images
+        disk_bytes (int):           Current size of cached images on disk, None until first measured
+        hits (int):                 Track changes rendered from a warm cache
+        misses (int):               Track changes that had to wait for a fetch
+    """
+    def __init__(self,
+                 max_bytes: int = ART_CACHE_BYTES,
+                 directory: str = ART_CACHE_DIR,
+                 max_disk_bytes: int = ART_CACHE_DISK_BYTES):
+        self.max_bytes: int = max_bytes
+        self.directory: str = directory
+        self.max_disk_bytes: int = max_disk_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.pending: Dict[tuple, threading.Event] = {}
+        self.downloads: Dict[tuple, Future] = {}
+        self.bytes: int = 0
+        self.disk_bytes: int = None
+        self.hits: int = 0
+        self.misses: int = 0
+        self.lock: threading.Lock = threading.Lock()
+        self.disk_lock: threading.Lock = threading.Lock()
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of track changes rendered from a warm cache"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    def record(self, url: str, size: Tuple[int, int]):
+        """
+        Count a track change as a hit if its album art is already cached, a miss otherwise
+        :param url: (str) URL to image, None if the track has no album art
+        :param size: (int, int) Image's maximum width and height
+        """
+        if url is None:
+            return
+        with self.lock:
+            cached = (url, tuple(size)) in self.entries
+        cached = cached or os.path.isfile(artwork_path(url, size, self.directory))
+        with self.lock:
+            if cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+        logging.debug(f'Art cache hit rate: {self.hit_rate:.0%} ({self.hits}/{self.hits + self.misses})')
+
+    def load(self, url: str, size: Tuple[int, int]) -> Artwork:
+        """
+        Get album art & palette, fetching them on a cache miss
+        :param url: (str) URL to image, None if the track has no album art
+        :param size: (int, int) Image's maximum width and height
+        :return: (Artwork) Artwork instance, None if there's no album art or it could not be fetched
+        """
+        if url is None:
+            return None
+        return self.get(url, size) or self.fetch(url, size)
+
+    def get(self, url: str, size: Tuple[int, int]) -> Artwork:
+        """
+        Get cached album art & palette from memory or disk, waiting for it (for a limited time) if it's being fetched
+        :param url: (str) URL to image
+        :param size: (int, int) Image's maximum width and height
+        :return: (Artwork) Artwork instance, None if not cached
+        """
+        key = (url, tuple(size))
+        with self.lock:
+            event = self.pending.get(key)
+        if event and not event.wait(ART_FETCH_TIMEOUT):
+            logging.warning(f'Gave up waiting for {url} to be fetched')
+            return None
+
+        with self.lock:
+            artwork = self.entries.get(key)
+            if artwork:
+                self.entries.move_to_end(key)
+                return artwork
+
+        artwork = read_artwork(url, size, self.directory)
+        if artwork:
+            self.put(key, artwork)
+        return artwork
+
+    def fetch(self, url: str, size: Tuple[int, int]) -> Artwork:
+        """
+        Download & analyze album art, then cache it
+        :param url: (str) URL to image
+        :param size: (int, int) Image's maximum width and height
+        :return: (Artwork) Artwork instance, None if it could not be downloaded or the download was cancelled
+        """
+        key = (url, tuple(size))
+        with self.lock:
+            event = self.pending.get(key)
+            if event is None:
+                self.pending[key] = threading.Event()
+        if event:  # Already being fetched by another thread
+            return self.get(url, size)
+
+        try:
+            content = self.download(key, url)
+            if content is None:
+                return None
+
+            start = time.perf_counter()
+            image = image_pool.decode_image(content, size)
+            palette = image_pool.analyze(image)
+            artwork = Artwork(image, palette, len(content), time.perf_counter() - start)
+            self.put(key, artwork)
+            write_artwork(url, size, artwork, self.directory)
+            self.prune(artwork_path(url, size, self.directory))
+            return artwork
+        finally:
+            with self.lock:
+                self.pending.pop(key).set()
+
+    def download(self, key: tuple, url: str) -> bytes:
+        """
+        Download an image, on the network loop if it's running so the download can be cancelled
+        :param key: (tuple) (url, size)
+        :param url: (str) URL to image
+        :return: (bytes) Encoded image, None if it could not be downloaded
+        """
+        if not network.running:
+            try:
+                response = session.get(url, timeout=NETWORK_TIMEOUT)
+            except RequestException as e:
+                logging.error(f'Could not get image at {url}: {e}')
+                return None
+            if response.ok:
+                return response.content
+            logging.error(f'Could not get image at {url}')
+            return None
+
+        future = network.submit(network.fetch(url))
+        with self.lock:
+            self.downloads[key] = future
+        try:
+            return future.result()
+        except (CancelledError, TimeoutError, asyncio.TimeoutError):
+            logging.debug(f'Download of {url} cancelled or timed out')
+            return None
+        except RequestException as e:
+            logging.error(f'Could not get image at {url}: {e}')
+            return None
+        finally:
+            with self.lock:
+                self.downloads.pop(key, None)
+
+    def cancel(self, url: str, size: Tuple[int, int]):
+        """
+        Cancel an in-flight download, e.g. of a track that's no longer playing
+        :param url: (str) URL to image
+        :param size: (int, int) Image's maximum width and height
+        """
+        with self.lock:
+            future = self.downloads.get((url, tuple(size)))
+        if future:
+            future.cancel()
+
+    def put(self, key: tuple, artwork: Artwork):
+        """
+        Cache artwork, evicting the least recently used entries to stay within the size limit
+        :param key: (tuple) (url, size)
+        :param artwork: (Artwork) Artwork instance
+        """
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.nbytes(self.entries.pop(key))
+            self.entries[key] = artwork
+            self.bytes += self.nbytes(artwork)
+
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= self.nbytes(evicted)
+
+    def prune(self, path: str):
+        """
+        Account for an image written to disk, deleting the least recently used ones once over the disk size limit.
+        Images are deleted until 10% under the limit, so the directory isn't scanned on every write.
+        :param path: (str) PNG file just written
+        """
+        with self.disk_lock:
+            try:
+                if self.disk_bytes is None:
+                    self.disk_bytes = sum(os.path.getsize(filename) for filename in self.files())
+                elif os.path.isfile(path):
+                    self.disk_bytes += os.path.getsize(path)
+                if self.disk_bytes <= self.max_disk_bytes:
+                    return
+
+                removed = 0
+                for filename in sorted(self.files(), key=os.path.getmtime):
+                    if self.disk_bytes <= self.max_disk_bytes * 0.9:
+                        break
+                    self.disk_bytes -= os.path.getsize(filename)
+                    os.remove(filename)
+                    removed += 1
+                logging.debug(f'Removed {removed} image(s) from the art cache directory')
+            except OSError:
+                logging.exception('Could not prune the art cache directory')
+                self.disk_bytes = None  # Measure again next time
+
+    def files(self) -> List[str]:
+        """
+        Get the on-disk cache's PNG files
+        :return: (list) PNG file paths, for every album art size
+        """
+        return glob.glob(os.path.join(self.directory, '*', '*.png'))
+
+    def prefetch(self, urls: List[str], size: Tuple[int, int]):
+        """
+        Fetch album art & palettes ahead of time, within the download & CPU budgets, stopping while the frame pacer
+        defers non-urgent work. Budgets are checked before each image, so the last one may go over them.
+        :param urls: (list) URLs to images, in order of priority
+        :param size: (int, int) Images' maximum width and height
+        """
+        downloaded, analysis_time = 0, 0
+        for url in urls:
+            if downloaded >= PREFETCH_BYTES or analysis_time >= PREFETCH_CPU_TIME:
+                logging.debug(f'Prefetch budget exhausted ({downloaded} bytes, {analysis_time:.2f}s)')
+                break
+            if not frame_pacer.allow_background():
+                logging.debug('Prefetch deferred, system is overloaded')
+                break
+
+            with self.lock:
+                pending = (url, tuple(size)) in self.pending
+            if not pending and not self.get(url, size):
+                artwork = self.fetch(url, size)
+                if artwork:
+                    downloaded += artwork.downloaded
+                    analysis_time += artwork.analysis_time
+
+    @staticmethod
+    def nbytes(artwork: Artwork) -> int:
+        """
+        Approximate memory used by an RGB image
+        :param artwork: (Artwork) Artwork instance
+        :return: (int) size in bytes
+        """
+        return artwork.image.width * artwork.image.height * 3
+
+
+art_cache = ArtCache()
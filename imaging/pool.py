@@ -0,0 +1,181 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+from constants import IMAGE_POOL_WORKERS
+from utils import decode_image, dominant_color, image_to_array, load_image_url, session, Palette, get_palette, \
+    palette_cache
+
+
+def _warm() -> int:
+    """
+    Run a tiny analysis so the worker has its imports loaded & KMeans ready
+    :return: (int) worker's process id
+    """
+    dominant_color(np.arange(48, dtype=np.uint8).reshape((4, 4, 3)))
+    return os.getpid()
+
+
+def _decode(name: str, length: int, size: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Decode the encoded image stored in a shared memory block & write its RGB pixels back into the same block
+    :param name: (str) Shared memory block name
+    :param length: (int) Encoded image length in bytes
+    :param size: (int, int) Image's maximum width and height
+    :return: (int, int) Decoded image's width and height
+    """
+    shm = SharedMemory(name=name)
+    try:
+        img = decode_image(bytes(shm.buf[:length]), size)
+        pixels = np.asarray(img)
+        np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf)[:] = pixels
+        return img.size
+    finally:
+        shm.close()
+
+
+def _dominant_color(name: str, shape: Tuple[int, int, int]) -> tuple:
+    """
+    Get best matching background color from an RGB pixel buffer stored in a shared memory block
+    :param name: (str) Shared memory block name
+    :param shape: (int, int, int) Pixel buffer's shape
+    :return: (tuple) RGB values
+    """
+    shm = SharedMemory(name=name)
+    try:
+        return dominant_color(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+    finally:
+        shm.close()
+
+
+class ImagePool:
+    """
+    Process pool to run CPU-heavy image work (decoding, resizing & KMeans) outside the main interpreter, so it
+    doesn't hold the GIL while text is scrolling. Images travel between processes as raw buffers in shared memory.
+    Until started, every method runs inline.
+
+    Attributes:
+        executor (ProcessPoolExecutor):     Worker pool
+        workers (int):                      Number of worker processes
+    """
+    def __init__(self):
+        self.executor: ProcessPoolExecutor = None
+        self.workers: int = 0
+
+    def start(self, workers: int = None):
+        """
+        Start & pre-warm worker processes
+        :param workers: (int) Number of worker processes. Defaults to one less than the number of cores
+        """
+        if self.executor:
+            return
+        self.workers = workers or min(IMAGE_POOL_WORKERS, max(1, (os.cpu_count() or 1) - 1))
+        # forkserver avoids forking the (multi-threaded) main process
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context('forkserver'))
+
+        # Submitting one job per worker spawns them all now, rather than during a track change
+        pids = [future.result() for future in [self.executor.submit(_warm) for _ in range(self.workers)]]
+        logging.debug(f'Image pool started with {self.workers} worker(s): {pids}')
+
+    def shutdown(self):
+        """Stop worker processes"""
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+
+    def load_image_url(self, url: str, size: Tuple[int, int]) -> Image:
+        """
+        Load Image file from URL, decoding it in a worker process
+        :param url: (str) URL to image
+        :param size: (int, int) Image's maximum width and height
+        :return: image: (PIL.Image) Image file
+        """
+        if self.executor is None:
+            return load_image_url(url, size)
+
+        response = session.get(url)
+        if response.ok:
+            return self.decode_image(response.content, size)
+        logging.error(f'Could not get image at {url}')
+
+    def decode_image(self, content: bytes, size: Tuple[int, int]) -> Image:
+        """
+        Decode encoded image bytes into a resized RGB Image in a worker process
+        :param content: (bytes) Encoded image (PNG, JPEG, ...)
+        :param size: (int, int) Image's maximum width and height
+        :return: image: (PIL.Image) Image file
+        """
+        if self.executor is None:
+            return decode_image(content, size)
+
+        # Large enough for both the encoded image & the decoded pixels, which never exceed size
+        shm = SharedMemory(create=True, size=max(len(content), size[0] * size[1] * 3))
+        try:
+            shm.buf[:len(content)] = content
+            width, height = self.executor.submit(_decode, shm.name, len(content), tuple(size)).result()
+            return Image.frombytes('RGB', (width, height), bytes(shm.buf[:width * height * 3]))
+        except BrokenProcessPool:
+            self.broken()
+            return decode_image(content, size)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def get_background_color(self, img: Image) -> tuple:
+        """
+        Get best matching background color based on album cover, running KMeans in a worker process
+        :param img: (PIL.Image) Album cover image
+        :return: (tuple) RGB values
+        """
+        return self.dominant_color(image_to_array(img.convert('RGB')))
+
+    def analyze(self, img: Image) -> Palette:
+        """
+        Get the palette to render over an image, skipping color analysis for images analyzed before
+        :param img: (PIL.Image) Album cover image
+        :return: (Palette) background & text colors
+        """
+        pixels = image_to_array(img.convert('RGB'))
+        key = palette_cache.key(pixels)
+        palette = palette_cache.get(key)
+        if palette is None:
+            palette = get_palette(self.dominant_color(pixels))
+            palette_cache.put(key, palette)
+        return palette
+
+    def dominant_color(self, pixels: np.ndarray) -> tuple:
+        """
+        Get best matching background color from an RGB pixel buffer, in a worker process
+        :param pixels: (np.ndarray) RGB pixel buffer
+        :return: (tuple) RGB values
+        """
+        if self.executor is None:
+            return dominant_color(pixels)
+
+        shm = SharedMemory(create=True, size=pixels.nbytes)
+        try:
+            np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf)[:] = pixels
+            return self.executor.submit(_dominant_color, shm.name, pixels.shape).result()
+        except BrokenProcessPool:
+            self.broken()
+            return dominant_color(pixels)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def broken(self):
+        """Fall back to inline processing if a worker process died"""
+        logging.error('Image pool worker died, processing images inline')
+        self.executor.shutdown(wait=False)
+        self.executor = None
+
+
+image_pool = ImagePool()
@@ -24,7 +24,7 @@ main() {
   echo "$(tput setaf 7)_________________________________________________________"
 
   echo -e "$(tput setaf 7)\nUpdating system & installing Python 3"
-  sudo apt-get update && sudo apt install python3-dev -y
+  sudo apt-get update && sudo apt install python3-dev fonts-unifont -y
 
   installMatrixLibrary
 
@@ -0,0 +1,97 @@
+import copy
+import json
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from constants import LOG_FILE, LOG_QUEUE_SIZE
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that drops records instead of blocking when the queue is full.
+    The number of dropped records is logged once there's room again.
+    Exceptions are kept apart from the message, so the listener's formatter decides how to write them.
+
+    Attributes:
+        dropped (int):      Records dropped so far
+        reported (int):     Dropped records already logged
+    """
+    def __init__(self, queue_: queue.Queue):
+        super().__init__(queue_)
+        self.dropped: int = 0
+        self.reported: int = 0
+        self.counter_lock: threading.Lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Copy record with its arguments merged into the message, & its traceback formatted but not merged
+        :param record: (logging.LogRecord) Record being logged
+        :return: (logging.LogRecord) Record to enqueue
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None  # Tracebacks keep their frames alive while queued
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        with self.counter_lock:
+            try:
+                if self.dropped > self.reported:
+                    self.queue.put_nowait(logging.makeLogRecord({'name': __name__,
+                                                                 'levelno': logging.WARNING,
+                                                                 'levelname': logging.getLevelName(logging.WARNING),
+                                                                 'msg': f'Dropped {self.dropped - self.reported} '
+                                                                        f'log record(s), queue was full'}))
+                    self.reported = self.dropped
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as JSON lines"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry)
+
+
+def setup_logging(level: int, json_lines: bool = False) -> QueueListener:
+    """
+    Route the root logger through a bounded queue, so the file is written on a dedicated thread
+    :param level: (int) Log level
+    :param json_lines: (bool) Write records as JSON lines
+    :return: (QueueListener) started listener writing to the log file, stop it on exit to flush remaining records
+    """
+    handler = RotatingFileHandler(filename=LOG_FILE,
+                                  maxBytes=5 * 1024 * 1024,  # 5MB
+                                  backupCount=4)
+    if json_lines:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(fmt='%(asctime)s %(levelname)s: %(message)s',
+                                               datefmt='%m/%d/%Y %I:%M:%S %p'))
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    logger = logging.getLogger('')
+    logger.setLevel(level)
+    logger.addHandler(DroppingQueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return listener
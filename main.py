@@ -1,7 +1,8 @@
 import logging
 import signal
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+import time
 
 import multitasking
 from PIL import Image, ImageDraw
@@ -9,21 +10,65 @@ from rgbmatrix import RGBMatrix
 from spotipy import SpotifyOauthError
 
 from api.data import Data
-from auth.spotify import oauth
+from api.limiter import RateLimiter
+from api.network import network
+from auth.spotify import oauth, accounts, viewport
+from constants import RAPID_REFRESH_RATE
+from imaging.pool import image_pool
+from log import setup_logging
+from matrix.history import frame_history
 from matrix.layout import Layout
+from matrix.viewport import Viewport
+from profiler import Profiler
 from renderer.loading import Loading
 from renderer.main import MainRenderer
-from utils import led_matrix_options, args
+from utils import led_matrix_options, args, palette_cache
 from version import __version__
 
 
 def main():
+    if IMAGE_POOL:
+        image_pool.start()
+    if ASYNC_NETWORK:
+        network.start()
+
+    if len(spotify) == 1:
+        run(matrix, canvas, draw, spotify[0])
+        return
+
+    # One poller & renderer per account, each in its own region of the matrix
+    limiter = RateLimiter()
+    threads = []
+    for account, sp, bounds in zip(accounts(), spotify, regions):
+        region = Viewport(matrix, canvas, *bounds)
+        region_canvas = Image.new('RGB', (region.width, region.height))
+        thread = threading.Thread(target=run_account,
+                                  args=(account, region, region_canvas, ImageDraw.Draw(region_canvas), sp, limiter),
+                                  name=account,
+                                  daemon=True)
+        thread.start()
+        threads.append(thread)
+        time.sleep(RAPID_REFRESH_RATE / len(spotify))  # Stagger polling
+    for thread in threads:
+        thread.join()
+
+
+def run(matrix, canvas, draw, sp, limiter=None):
     layout = Layout(matrix.width, matrix.height)
     Loading(matrix, canvas, draw, layout)
-    data = Data(sp)
+    data = Data(sp, layout.coords['now_playing']['album_art']['size'], limiter)
+    if network.running:
+        network.submit(network.poll(data))
     MainRenderer(matrix, canvas, draw, layout, data)
 
 
+def run_account(account, matrix, canvas, draw, sp, limiter):
+    try:
+        run(matrix, canvas, draw, sp, limiter)
+    except Exception:
+        logging.exception(f'Account {account} stopped')
+
+
 if __name__ == '__main__':
     print(f'\U0001F3B5 Now-Playing - v{__version__}')
 
@@ -33,22 +78,41 @@ if __name__ == '__main__':
     else:
         LOG_LEVEL = logging.INFO
 
-    logger = logging.getLogger('')
-    logger.setLevel(LOG_LEVEL)
-    handler = RotatingFileHandler(filename='now-playing.log',
-                                  maxBytes=5 * 1024 * 1024,  # 5MB
-                                  backupCount=4)
-    handler.setFormatter(logging.Formatter(fmt='%(asctime)s %(levelname)s: %(message)s',
-                                           datefmt='%m/%d/%Y %I:%M:%S %p'))
-    logger.addHandler(handler)
+    if '--image-pool' in sys.argv:
+        IMAGE_POOL = True
+        sys.argv.remove('--image-pool')
+    else:
+        IMAGE_POOL = False
+
+    if '--async-network' in sys.argv:
+        ASYNC_NETWORK = True
+        sys.argv.remove('--async-network')
+    else:
+        ASYNC_NETWORK = False
+
+    if '--log-json' in sys.argv:
+        LOG_JSON = True
+        sys.argv.remove('--log-json')
+    else:
+        LOG_JSON = False
+
+    if '--profile' in sys.argv:
+        profiler = Profiler()
+        sys.argv.remove('--profile')
+    else:
+        profiler = None
+
+    log_listener = setup_logging(LOG_LEVEL, LOG_JSON)
 
-    # Authenticate & cache token
+    # Authenticate & cache tokens
     try:
         logging.debug('Authenticating...')
-        sp = oauth()
-        sp.me()
+        spotify = [oauth(account) for account in accounts()]
+        for sp in spotify:
+            sp.me()
     except SpotifyOauthError:
         logging.exception('Authorization could not be completed')
+        log_listener.stop()
         sys.exit(1)
 
     matrix = RGBMatrix(options=led_matrix_options(args()))
@@ -56,10 +120,30 @@ if __name__ == '__main__':
     draw = ImageDraw.Draw(canvas)
     matrix.SetImage(canvas)
 
+    # Check every account's region up front, rather than leaving its tile blank
+    try:
+        regions = [viewport(account, matrix.width, matrix.height) for account in accounts()]
+    except ValueError as e:
+        logging.error(f'Invalid viewport configuration: {e}')
+        log_listener.stop()
+        sys.exit(1)
+
+    if profiler:
+        profiler.start()
+
+    # Export recently shown frames on `kill -USR1`, off the signal handler
+    signal.signal(signal.SIGUSR1, lambda *_: threading.Thread(target=frame_history.export).start())
+
     try:
         main()
     except Exception as e:
         logging.exception(SystemExit(e))
     finally:
         signal.signal(signal.SIGINT, multitasking.killall)
+        image_pool.shutdown()
+        network.stop()
+        palette_cache.save()
+        if profiler:
+            profiler.stop()
         matrix.Clear()
+        log_listener.stop()
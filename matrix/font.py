@@ -0,0 +1,134 @@
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+from fontTools.ttLib import TTFont
+from PIL import Image, ImageDraw
+from PIL.ImageFont import FreeTypeFont
+
+
+def get_coverage(filename: str) -> frozenset:
+    """
+    Get the code points a font file has glyphs for
+    :param filename: (str) Location of font file
+    :return: (frozenset) Covered code points
+    """
+    with TTFont(filename, lazy=True) as font:
+        return frozenset(font.getBestCmap() or ())
+
+
+class GlyphAtlas:
+    """
+    Rendered glyph masks by font & character, so each glyph is only rasterized once
+
+    Attributes:
+        glyphs (dict):      (mask, advance) by (font index, character)
+    """
+    def __init__(self):
+        self.glyphs: Dict[Tuple[int, str], Tuple[Image.Image, int]] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    def get(self, index: int, font: FreeTypeFont, char: str) -> Tuple[Image.Image, int]:
+        """
+        Get glyph mask, rendering it on first use
+        :param index: (int) Font's index in its FontStack
+        :param font: (FreeTypeFont) Font to render glyph with
+        :param char: (str) Character
+        :return: (PIL.Image, int) Glyph mask & horizontal advance
+        """
+        glyph = self.glyphs.get((index, char))
+        if glyph is None:
+            width, height = font.getsize(char)
+            mask = Image.new('L', (max(width, 1), max(height, 1)))
+            ImageDraw.Draw(mask).text((0, 0), char, 255, font)
+            glyph = (mask, width)
+            with self.lock:
+                self.glyphs[(index, char)] = glyph
+        return glyph
+
+
+class FontStack:
+    """
+    Ordered list of fonts, where each character is drawn with the first font that has a glyph for it
+
+    Arguments:
+        fonts (list):           (FreeTypeFont, coverage) pairs, primary font first
+
+    Attributes:
+        fonts (list):           FreeTypeFont instances
+        coverage (list):        Code points covered by each font
+        indexes (dict):         Font index by character, memoized
+        baselines (list):       Vertical offset aligning each font's baseline with the primary font's
+        atlas (GlyphAtlas):     Rendered glyphs of mixed-font text
+    """
+    def __init__(self, fonts: List[Tuple[FreeTypeFont, frozenset]]):
+        self.fonts: List[FreeTypeFont] = [font for font, _ in fonts]
+        self.coverage: List[frozenset] = [coverage for _, coverage in fonts]
+        self.indexes: Dict[str, int] = {}
+        self.baselines: List[int] = [self.fonts[0].getmetrics()[0] - font.getmetrics()[0] for font in self.fonts]
+        self.atlas: GlyphAtlas = GlyphAtlas()
+
+    @property
+    def primary(self) -> FreeTypeFont:
+        return self.fonts[0]
+
+    def font_index(self, char: str) -> int:
+        """
+        Get index of the first font covering a character
+        :param char: (str) Character
+        :return: (int) Font index, primary font if no font covers it
+        """
+        index = self.indexes.get(char)
+        if index is None:
+            code = ord(char)
+            index = next((i for i, coverage in enumerate(self.coverage) if code in coverage), 0)
+            if index == 0 and code not in self.coverage[0] and char.isprintable():
+                logging.warning(f'No font has a glyph for {char!r}')
+            self.indexes[char] = index
+        return index
+
+    def is_primary(self, text: str) -> bool:
+        """
+        Determine if text can be drawn with the primary font alone
+        :param text: (str) Text
+        :return: bool to indicate if no fallback fonts are needed
+        """
+        return all(self.font_index(char) == 0 for char in text)
+
+    def getsize(self, text: str) -> Tuple[int, int]:
+        """
+        Get the size of a single line of text
+        :param text: (str) Text
+        :return: (int, int) Width and height
+        """
+        if self.is_primary(text):
+            return self.primary.getsize(text)
+
+        width, height = 0, 0
+        for char in text:
+            mask, advance = self.atlas.get(self.font_index(char), self.fonts[self.font_index(char)], char)
+            width += advance
+            height = max(height, mask.height)
+        return width, height
+
+    def draw(self, draw: ImageDraw, xy: Tuple[int, int], text: str, fill: tuple, spacing: int = 0):
+        """
+        Draw (multi-line) text, falling back to other fonts for characters missing from the primary font
+        :param draw: (PIL.ImageDraw) ImageDraw instance
+        :param xy: (int, int) Text's top-left corner
+        :param text: (str) Text
+        :param fill: (tuple) Text color
+        :param spacing: (int) Pixels between lines
+        """
+        x, y = xy
+        for line in text.split('\n'):
+            if self.is_primary(line):
+                draw.text((x, y), line, fill, self.primary)
+            else:
+                offset = x
+                for char in line:
+                    index = self.font_index(char)
+                    mask, advance = self.atlas.get(index, self.fonts[index], char)
+                    draw.bitmap((offset, y + self.baselines[index]), mask, fill=fill)
+                    offset += advance
+            y += self.primary.getsize('A')[1] + spacing
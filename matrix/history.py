@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+from PIL import Image
+
+from constants import FRAME_HISTORY_BYTES, FRAME_HISTORY_LENGTH, FRAME_HISTORY_BACKLOG, HISTORY_DIR
+
+
+def to_rgb565(image) -> np.ndarray:
+    """
+    Pack an RGB image into 16-bit RGB565 pixels
+    :param image: (PIL.Image | np.ndarray) RGB image
+    :return: (np.ndarray) RGB565 pixels
+    """
+    rgb = np.asarray(image, dtype=np.uint16)
+    return ((rgb[..., 0] >> 3) << 11) | ((rgb[..., 1] >> 2) << 5) | (rgb[..., 2] >> 3)
+
+
+def from_rgb565(pixels: np.ndarray) -> Image:
+    """
+    Unpack 16-bit RGB565 pixels into an RGB image
+    :param pixels: (np.ndarray) RGB565 pixels
+    :return: (PIL.Image) RGB image
+    """
+    r = (pixels >> 11) & 0x1F
+    g = (pixels >> 5) & 0x3F
+    b = pixels & 0x1F
+    rgb = np.dstack(((r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)))
+    return Image.fromarray(rgb.astype(np.uint8), 'RGB')
+
+
+class FrameHistory:
+    """
+    Memory-bounded history of the last frames shown on the matrix
+
+    The latest frame is kept as RGB565, older ones as compressed XOR deltas against the frame that followed them.
+    Frames are rebuilt backwards from the latest one, so the oldest delta can be dropped at any time.
+    Recording a frame only copies its pixels; packing & compression run on a background thread. If that thread falls
+    behind, the oldest frames waiting for it are dropped.
+
+    Arguments:
+        max_bytes (int):        Memory reserved for deltas
+        max_frames (int):       Maximum number of frames kept
+        backlog (int):          Maximum number of frames waiting to be compressed
+
+    Attributes:
+        pending (deque):        (timestamp, size, RGB pixels) of frames waiting to be compressed, oldest first
+        deltas (deque):         (timestamp, compressed delta) of older frames, oldest first
+        latest (np.ndarray):    Latest frame
+        latest_time (float):    Latest frame's timestamp
+        bytes (int):            Current size of deltas
+    """
+    def __init__(self,
+                 max_bytes: int = FRAME_HISTORY_BYTES,
+                 max_frames: int = FRAME_HISTORY_LENGTH,
+                 backlog: int = FRAME_HISTORY_BACKLOG):
+        self.max_bytes: int = max_bytes
+        self.max_frames: int = max_frames
+        self.pending: deque = deque(maxlen=backlog)
+        self.deltas: deque = deque()
+        self.latest: np.ndarray = None
+        self.latest_time: float = 0
+        self.bytes: int = 0
+        self.lock: threading.Lock = threading.Lock()
+        self.ready: threading.Event = threading.Event()
+        self.thread: threading.Thread = None
+
+    @property
+    def memory(self) -> int:
+        """Memory reserved by the history, in bytes"""
+        if self.latest is None:
+            return self.max_bytes
+        return self.max_bytes + self.latest.nbytes * (2 + 3 * self.pending.maxlen) // 2  # RGB888 is 1.5x RGB565
+
+    def add(self, image: Image):
+        """
+        Record a frame, copying its pixels for the background thread to compress
+        :param image: (PIL.Image) Frame shown on the matrix
+        """
+        self.pending.append((time.time(), image.size, image.tobytes()))
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='frame-history', daemon=True)
+                    self.thread.start()
+        self.ready.set()
+
+    def run(self):
+        while True:
+            self.ready.wait()
+            self.ready.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Compress frames waiting in the backlog into deltas
+        """
+        with self.lock:
+            while self.pending:
+                timestamp, (width, height), pixels = self.pending.popleft()
+                frame = to_rgb565(np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 3))
+                first = self.latest is None
+                if self.latest is not None and self.latest.shape == frame.shape:
+                    delta = zlib.compress((self.latest ^ frame).tobytes(), 1)
+                    self.deltas.append((self.latest_time, delta))
+                    self.bytes += len(delta)
+                    while self.deltas and (self.bytes > self.max_bytes or len(self.deltas) >= self.max_frames):
+                        self.bytes -= len(self.deltas.popleft()[1])
+                self.latest = frame
+                self.latest_time = timestamp
+                if first:
+                    logging.debug(f'Frame history: up to {self.max_frames} frames in {self.memory / 1024:.0f} KiB')
+
+    def frames(self) -> list:
+        """
+        Rebuild recorded frames
+        :return: (list) (timestamp, PIL.Image) pairs, oldest first
+        """
+        self.flush()
+        with self.lock:
+            if self.latest is None:
+                return []
+            deltas = list(self.deltas)
+            current = self.latest
+            frames = [(self.latest_time, current)]
+
+        for timestamp, delta in reversed(deltas):
+            current = current ^ np.frombuffer(zlib.decompress(delta), dtype=np.uint16).reshape(current.shape)
+            frames.append((timestamp, current))
+        return [(timestamp, from_rgb565(frame)) for timestamp, frame in reversed(frames)]
+
+    def export(self, directory: str = HISTORY_DIR) -> str:
+        """
+        Write recorded frames as an animated GIF, along with a JSON file of their timestamps & the history's memory
+        :param directory: (str) Directory to write to
+        :return: (str) GIF path, None if there are no frames
+        """
+        frames = self.frames()
+        if not frames:
+            return None
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, time.strftime('%Y%m%d-%H%M%S'))
+        timestamps = [timestamp for timestamp, _ in frames]
+        durations = [int((end - start) * 1000) or 1 for start, end in zip(timestamps, timestamps[1:])] + [1000]
+        images = [image for _, image in frames]
+        images[0].save(f'{path}.gif', save_all=True, append_images=images[1:], duration=durations, loop=0)
+        with open(f'{path}.json', 'w') as file:
+            json.dump({'timestamps': timestamps, 'memory': self.memory}, file)
+
+        logging.info(f'Exported {len(frames)} frames to {path}.gif')
+        return f'{path}.gif'
+
+
+frame_history = FrameHistory()
@@ -1,8 +1,9 @@
+import logging
+import os
 from dataclasses import dataclass, field
 
-from PIL.ImageFont import FreeTypeFont
-
 from constants import LAYOUT_FILE
+from matrix.font import FontStack, get_coverage
 from utils import read_json, load_font
 
 
@@ -13,13 +14,26 @@ class Layout:
     height: int
     json: dict = field(init=False)
     coords: dict = field(init=False)
-    primary_font: FreeTypeFont = field(init=False)
-    secondary_font: FreeTypeFont = field(init=False)
+    primary_font: FontStack = field(init=False)
+    secondary_font: FontStack = field(init=False)
 
     def __post_init__(self):
         self.json = read_json(LAYOUT_FILE.format(self.width, self.height))
         self.coords = self.json['coords']
-        self.primary_font = load_font(self.json['fonts']['primary']['path'],
-                                      self.json['fonts']['primary']['size'])
-        self.secondary_font = load_font(self.json['fonts']['secondary']['path'],
-                                        self.json['fonts']['secondary']['size'])
+        self.primary_font = self.load_fonts(self.json['fonts']['primary'])
+        self.secondary_font = self.load_fonts(self.json['fonts']['secondary'])
+
+    @staticmethod
+    def load_fonts(config: dict) -> FontStack:
+        """
+        Load a font & its fallback fonts, skipping fallbacks that aren't installed
+        :param config: (dict) Font configuration, with path, size & optional fallback list
+        :return: (FontStack) FontStack instance
+        """
+        fonts = [config]
+        for font in config.get('fallback', []):
+            if os.path.isfile(font['path']):
+                fonts.append(font)
+            else:
+                logging.warning(f'Fallback font {font["path"]} is not installed, run update.sh to install it')
+        return FontStack([(load_font(font['path'], font['size']), get_coverage(font['path'])) for font in fonts])
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+
+from constants import SCROLL_SPEED, MAX_SCROLL_SPEED, FRAME_BUDGET, PACING_INTERVAL, PACING_MAX_LOAD, \
+    PACING_MAX_TEMPERATURE, THERMAL_FILE
+
+
+class SysfsSource:
+    """System readings: CPU load from /proc & SoC temperature from sysfs"""
+    @staticmethod
+    def temperature() -> float:
+        """
+        SoC temperature
+        :return: (float) degrees Celsius, None if not available
+        """
+        try:
+            with open(THERMAL_FILE) as file:
+                return int(file.read()) / 1000
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def load() -> float:
+        """
+        CPU load
+        :return: (float) 1-minute load average per core
+        """
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+
+
+class FakeSource:
+    """
+    Fixed system readings, for the soak test's pacing check
+
+    Arguments:
+        temperature (float):    SoC temperature [°C]
+        load (float):           Load average per core
+    """
+    def __init__(self, temperature: float = 45, load: float = 0.1):
+        self._temperature: float = temperature
+        self._load: float = load
+
+    def temperature(self) -> float:
+        return self._temperature
+
+    def load(self) -> float:
+        return self._load
+
+
+class FramePacer:
+    """
+    Adapts the animation frame rate to stay within a per-frame render budget, & tells non-urgent work (prefetching,
+    color analysis) to wait while the system is overloaded. Every few seconds, the average frame render time, CPU load
+    & SoC temperature are checked: if any is over its limit, frames are spaced out further, otherwise they're brought
+    back towards the base rate. Checks happen on animation frames, or when non-urgent work asks to run, so readings stay
+    current while nothing is scrolling.
+
+    Arguments:
+        source:                     System readings, SysfsSource or FakeSource
+
+    Attributes:
+        interval (float):           Seconds between animation frames
+        frame_time (float):         Moving average of frame render time [s]
+        throttled (bool):           Boolean to indicate if non-urgent work should wait
+        metrics (dict):             Latest readings & decisions
+    """
+    def __init__(self, source=None):
+        self.source = source or SysfsSource()
+        self.interval: float = SCROLL_SPEED
+        self.frame_time: float = 0
+        self.throttled: bool = False
+        self.checked: float = time.monotonic()
+        self.checked_frames: int = 0
+        self.metrics: dict = {'frames': 0, 'deferred': 0, 'adjustments': 0}
+        self.lock: threading.RLock = threading.RLock()
+
+    def frame(self, elapsed: float) -> float:
+        """
+        Record an animation frame's render time
+        :param elapsed: (float) Seconds spent rendering the frame
+        :return: (float) Seconds to wait before the next frame
+        """
+        with self.lock:
+            self.frame_time = elapsed if not self.metrics['frames'] else 0.8 * self.frame_time + 0.2 * elapsed
+            self.metrics['frames'] += 1
+            if time.monotonic() - self.checked >= PACING_INTERVAL:
+                self.adjust()
+            return max(0, self.interval - elapsed)
+
+    def adjust(self):
+        """
+        Space frames out while over budget, or bring them back towards the base rate
+        """
+        with self.lock:
+            self.checked = time.monotonic()
+            if self.metrics['frames'] == self.checked_frames:
+                self.frame_time = 0  # Nothing animated since the last check
+            self.checked_frames = self.metrics['frames']
+            temperature = self.source.temperature()
+            load = self.source.load()
+            overloaded = (self.frame_time > FRAME_BUDGET
+                          or load > PACING_MAX_LOAD
+                          or (temperature is not None and temperature > PACING_MAX_TEMPERATURE))
+
+            if overloaded:
+                interval = min(self.interval * 1.5, MAX_SCROLL_SPEED)
+            else:
+                interval = max(self.interval / 1.25, SCROLL_SPEED)
+            if interval != self.interval or overloaded != self.throttled:
+                self.metrics['adjustments'] += 1
+                logging.debug(f'Frame pacing: {1 / interval:.1f} FPS, '
+                              f'non-urgent work {"deferred" if overloaded else "allowed"} '
+                              f'(frame {self.frame_time * 1000:.1f}ms, load {load:.2f}, temperature {temperature}°C)')
+            self.interval = interval
+            self.throttled = overloaded
+            self.metrics.update({'fps': 1 / interval,
+                                 'frame_time': self.frame_time,
+                                 'load': load,
+                                 'temperature': temperature,
+                                 'throttled': overloaded})
+
+    def allow_background(self) -> bool:
+        """
+        Determine if non-urgent work can run now, counting it as deferred otherwise
+        :return: bool to indicate if work can run
+        """
+        with self.lock:
+            if time.monotonic() - self.checked >= PACING_INTERVAL:
+                self.adjust()
+            if self.throttled:
+                self.metrics['deferred'] += 1
+            return not self.throttled
+
+
+frame_pacer = FramePacer()
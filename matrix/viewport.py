@@ -0,0 +1,44 @@
+import threading
+
+from PIL import Image
+from rgbmatrix import RGBMatrix
+
+from matrix.history import frame_history
+
+
+class Viewport:
+    """
+    Region of a shared matrix, which renderers can draw to as if it was a matrix of its own
+
+    Arguments:
+        matrix (rgbmatrix.RGBMatrix):       Shared matrix
+        frame (PIL.Image):                  Shared canvas with the whole matrix's frame
+        x (int):                            Region's left edge
+        y (int):                            Region's top edge
+        width (int):                        Region's width
+        height (int):                       Region's height
+    """
+    lock = threading.Lock()  # Viewports share a single frame
+
+    def __init__(self, matrix, frame, x, y, width, height):
+        self.matrix: RGBMatrix = matrix
+        self.frame: Image = frame
+        self.x: int = x
+        self.y: int = y
+        self.width: int = width
+        self.height: int = height
+
+    def SetImage(self, image: Image):
+        """
+        Show image in the region, keeping the rest of the matrix as is, & record the whole matrix's frame
+        :param image: (PIL.Image) Region-sized image
+        """
+        with self.lock:
+            self.frame.paste(image, (self.x, self.y))
+            self.matrix.SetImage(self.frame)
+            frame_history.add(self.frame)  # Copied before other viewports paste into it
+
+    def Clear(self):
+        with self.lock:
+            self.frame.paste((0, 0, 0), (self.x, self.y, self.x + self.width, self.y + self.height))
+            self.matrix.SetImage(self.frame)
@@ -1,12 +1,13 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(frozen=True)
 class Track:
+    __slots__ = ('id', 'name', 'artist', 'album', 'album_art_url', 'length', 'uri')
     id: str
     name: str
     artist: str
     album: str
-    album_art_url: str
+    album_art_url: str  # None for local files
     length: int  # [ms]
     uri: str
@@ -1,8 +1,9 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(frozen=True)
 class User:
+    __slots__ = ('name', 'id', 'followers', 'icon_url', 'uri')
     name: str
     id: str
     followers: int
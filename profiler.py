@@ -0,0 +1,140 @@
+import glob
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from constants import PROFILE_DIR, PROFILE_INTERVAL, PROFILE_DUMP_INTERVAL, PROFILE_DUMPS, PROFILE_TOP_ALLOCATIONS, \
+    PROFILE_TRACEBACK_DEPTH
+
+# Allocations made by image loading & color analysis
+ALLOCATION_FILTERS = [tracemalloc.Filter(True, pattern, all_frames=True)
+                      for pattern in ('*/PIL/*', '*/numpy/*', '*/sklearn/*', '*utils.py', '*/imaging/*')]
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def call_site(traceback: tracemalloc.Traceback) -> str:
+    """
+    Find where the app's own code made an allocation, rather than the library line that did it
+    :param traceback: (tracemalloc.Traceback) Allocation's traceback, oldest frame first
+    :return: (str) filename:line of the innermost app frame, or of the innermost frame if there's none
+    """
+    for frame in reversed(traceback):
+        if frame.filename.startswith(APP_DIR) and 'site-packages' not in frame.filename:
+            return f'{os.path.relpath(frame.filename, APP_DIR)}:{frame.lineno}'
+    return f'{traceback[-1].filename}:{traceback[-1].lineno}'
+
+
+def rss() -> int:
+    """Resident memory of the process, in bytes"""
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class Profiler:
+    """
+    Low-overhead sampling profiler & allocation tracker for long-running units
+
+    Every thread's stack is sampled at a fixed interval. Periodically, the collapsed stacks (flame graph format) and
+    the allocations that grew the most since the previous dump are written to disk, keeping only the latest dumps.
+    Allocations are grouped by the app code that made them. PIL allocates pixel buffers with C malloc, which tracemalloc
+    can't see, so images that are never released only show up in the resident memory written with each dump.
+
+    Arguments:
+        directory (str):        Directory to write dumps to
+        interval (float):       Seconds between stack samples
+        dump_interval (float):  Seconds between dumps
+
+    Attributes:
+        samples (Counter):      Sample count by collapsed stack
+        snapshot (Snapshot):    Allocations at the previous dump
+        running (bool):         Boolean to indicate if profiler is sampling
+    """
+    def __init__(self,
+                 directory: str = PROFILE_DIR,
+                 interval: float = PROFILE_INTERVAL,
+                 dump_interval: float = PROFILE_DUMP_INTERVAL):
+        self.directory: str = directory
+        self.interval: float = interval
+        self.dump_interval: float = dump_interval
+        self.samples: Counter = Counter()
+        self.snapshot: tracemalloc.Snapshot = None
+        self.running: bool = False
+        self.thread: threading.Thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tracemalloc.start(PROFILE_TRACEBACK_DEPTH)
+        self.snapshot = self.take_snapshot()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='profiler', daemon=True)
+        self.thread.start()
+        logging.info(f'Profiling, writing dumps to {self.directory}/')
+
+    def stop(self):
+        """Stop sampling & write a final dump"""
+        if self.running:
+            self.running = False
+            self.thread.join()
+            self.dump()
+            tracemalloc.stop()
+
+    def run(self):
+        next_dump = time.monotonic() + self.dump_interval
+        while self.running:
+            self.sample()
+            if time.monotonic() >= next_dump:
+                self.dump()
+                next_dump = time.monotonic() + self.dump_interval
+            time.sleep(self.interval)
+
+    def sample(self):
+        """Record the current stack of every thread but the profiler's"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == threading.get_ident():
+                continue
+            stack = []
+            while frame:
+                stack.append(f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self):
+        """Write collapsed stacks & top allocation diffs, then remove old dumps"""
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+
+        with open(os.path.join(self.directory, f'stacks-{stamp}.folded'), 'w') as file:
+            for stack, count in self.samples.most_common():
+                file.write(f'{stack} {count}\n')
+        self.samples.clear()
+
+        snapshot = self.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        threads = threading.enumerate()
+        growth, blocks = Counter(), Counter()
+        for stat in snapshot.compare_to(self.snapshot, 'traceback'):
+            if stat.size_diff > 0:
+                site = call_site(stat.traceback)
+                growth[site] += stat.size_diff
+                blocks[site] += stat.count_diff
+        with open(os.path.join(self.directory, f'allocations-{stamp}.txt'), 'w') as file:
+            file.write(f'Resident memory: {rss() / 1024:.1f} KiB\n')
+            file.write(f'Traced memory: {current / 1024:.1f} KiB (peak: {peak / 1024:.1f} KiB)\n')
+            file.write(f'Threads ({len(threads)}): {", ".join(thread.name for thread in threads)}\n\n')
+            for site, size in growth.most_common(PROFILE_TOP_ALLOCATIONS):
+                file.write(f'{site}: +{size / 1024:.1f} KiB ({blocks[site]:+d} blocks)\n')
+        self.snapshot = snapshot
+        logging.debug(f'Wrote profile dump {stamp}')
+
+        for pattern in ('stacks-*.folded', 'allocations-*.txt'):
+            for filename in sorted(glob.glob(os.path.join(self.directory, pattern)))[:-PROFILE_DUMPS]:
+                os.remove(filename)
+
+    @staticmethod
+    def take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(ALLOCATION_FILTERS)
@@ -18,7 +18,7 @@ class Loading(Renderer):
     def render(self):
         self.render_logo()
         self.render_version()
-        self.matrix.SetImage(self.canvas)
+        self.commit()
 
     def render_version(self):
         x, y = align_text(self.layout.primary_font.getsize(__version__),
@@ -26,7 +26,7 @@ class Loading(Renderer):
                           self.matrix.height,
                           Position.CENTER,
                           Position.BOTTOM)
-        self.draw.text((x, y), __version__, Color.ORANGE, self.layout.primary_font)
+        self.layout.primary_font.draw(self.draw, (x, y), __version__, Color.ORANGE)
 
     def render_logo(self):
         logo = load_image('assets/img/spotify.png',
@@ -1,14 +1,16 @@
 import logging
+import threading
 import time
 
 from PIL import Image
 
 from api.data import Data
-from constants import RAPID_REFRESH_RATE
+from api.events import TrackChanged, PlayStateChanged
+from constants import RAPID_REFRESH_RATE, SLOW_REFRESH_RATE, SCROLL_PAUSE
+from imaging.cache import art_cache
 from model.track import Track
 from renderer.renderer import Renderer
-from utils import Color, load_image_url, off_screen, get_background_color, is_background_light, Position, align_image, \
-    multiline_text
+from utils import Color, off_screen, Position, align_image, multiline_text
 
 
 class NowPlaying(Renderer):
@@ -26,6 +28,8 @@ class NowPlaying(Renderer):
         primary_color (tuple):          Primary text color
         secondary_color (tuple):        Secondary text color
         refresh (bool):                 Bool to indicate if canvas needs to refresh
+        wake (threading.Event):         Set to refresh before the next scheduled update
+        failures (int):                 Consecutive failures to load the current track's album art
     """
     def __init__(self, matrix, canvas, draw, layout, data):
         super().__init__(matrix, canvas, draw, layout)
@@ -37,24 +41,56 @@ class NowPlaying(Renderer):
         self.primary_color: tuple = Color.WHITE
         self.secondary_color: tuple = Color.GRAY
         self.refresh: bool = True
+        self.wake: threading.Event = threading.Event()
+        self.failures: int = 0
+        self.data.subscribe(TrackChanged, self.on_track_changed)
+        self.data.subscribe(PlayStateChanged, self.on_play_state_changed)
 
     def render(self):
         while self.data.is_playing:
+            delay = RAPID_REFRESH_RATE
             if self.refresh:
-                self.setup()
+                self.refresh = False
+                if self.setup():
+                    self.failures = 0
+                elif self.data.track.uri != self.track.uri:
+                    continue  # Track changed while loading, its download was cancelled
+                else:  # Show the track without album art meanwhile
+                    self.failures += 1
+                    self.refresh = True
+                    delay = min(RAPID_REFRESH_RATE * 2 ** (self.failures - 1), SLOW_REFRESH_RATE)
+                    logging.warning(f'Could not load album art, retrying in {delay}s')
                 self.render_background()
                 self.render_album_art()
                 self.render_title()
                 self.render_artist()
-                self.matrix.SetImage(self.canvas)
-            time.sleep(RAPID_REFRESH_RATE)
-            self.refresh = self.data.update()
+                self.commit()
+            self.wake.wait(delay)
+            self.wake.clear()
+            self.data.update()
         self.scrolling = False
 
+    def on_track_changed(self, event: TrackChanged):
+        if not event.replay:  # Same track restarting needs no redraw
+            self.refresh = True
+            self.failures = 0
+            art_cache.record(event.track.album_art_url, self.coords['album_art']['size'])
+            if event.prev_track and event.prev_track.album_art_url != event.track.album_art_url:
+                # Stop downloading art that won't be shown
+                art_cache.cancel(event.prev_track.album_art_url, self.coords['album_art']['size'])
+            self.wake.set()
+
+    def on_play_state_changed(self, event: PlayStateChanged):
+        if event.is_playing:  # Screen was replaced while paused
+            self.refresh = True
+            self.wake.set()
+
     def render_background(self):
         self.draw.rectangle(((0, 0), (self.matrix.width, self.matrix.height)), self.background)
 
     def render_album_art(self):
+        if self.album_art is None:
+            return
         x, y = align_image(self.album_art,
                            self.matrix.width,
                            self.matrix.height,
@@ -75,9 +111,9 @@ class NowPlaying(Renderer):
                 self.scrolling = True
                 self.scroll_text(self.track.name, self.primary_color, self.layout.primary_font, self.background, (x, y))
             else:
-                self.draw.text((x, y), self.track.name, self.primary_color, self.layout.primary_font)
+                self.layout.primary_font.draw(self.draw, (x, y), self.track.name, self.primary_color)
         except UnicodeEncodeError as e:
-            logging.error('Unsupported character', e.reason)
+            logging.error(f'Unsupported character: {e.reason}')
 
     # TODO: Multiple lines could go off-screen
     def render_artist(self):
@@ -98,27 +134,37 @@ class NowPlaying(Renderer):
                 else:
                     artist = multiline_text(artist,
                                             ((self.matrix.width - x) // self.layout.secondary_font.getsize('A')[0]))
-            return self.draw.text((x, y),
-                                  artist,
-                                  self.secondary_color,
-                                  self.layout.secondary_font,
-                                  spacing=self.coords['artist']['line_spacing'])
+            return self.layout.secondary_font.draw(self.draw,
+                                                   (x, y),
+                                                   artist,
+                                                   self.secondary_color,
+                                                   spacing=self.coords['artist']['line_spacing'])
         except UnicodeEncodeError as e:
-            logging.error('Unsupported character', e.reason)
-
-    def setup(self):
+            logging.error(f'Unsupported character: {e.reason}')
+
+    def setup(self) -> bool:
+        """
+        Load the current track's album art & colors, or plain colors without album art if it has none (e.g. local
+        files) or it could not be loaded
+        :return: bool to indicate if the track is ready to render, False if its album art should be loaded again
+        """
         self.track = self.data.track
         self.scrolling = False
-        time.sleep(2.5)
-        self.album_art = load_image_url(self.track.album_art_url,
-                                        self.coords['album_art']['size'])
-        self.background = get_background_color(self.album_art)
-
-        if is_background_light(self.background):
-            self.primary_color = Color.DARK_PRIMARY
-            self.secondary_color = Color.DARK_SECONDARY
-        else:
-            self.primary_color = Color.LIGHT_PRIMARY
-            self.secondary_color = Color.LIGHT_SECONDARY
+        time.sleep(SCROLL_PAUSE)  # Let scroll threads stop
+        artwork = art_cache.load(self.track.album_art_url, self.coords['album_art']['size'])
+        if artwork is None:
+            self.album_art = None
+            self.background = Color.BLACK
+            self.primary_color = Color.WHITE
+            self.secondary_color = Color.GRAY
+            if self.track.album_art_url:
+                return False
+            logging.info(f'Now Playing: {self.track}')
+            return True
+        self.album_art = artwork.image
+        self.background = artwork.palette.background
+        self.primary_color = artwork.palette.primary
+        self.secondary_color = artwork.palette.secondary
 
         logging.info(f'Now Playing: {self.track}')
+        return True
@@ -1,28 +1,62 @@
+import asyncio
+import glob
+import hashlib
+import json
 import logging
+import os
 import time
 
+from PIL import Image
+
 from api.data import Data
-from constants import SLOW_REFRESH_RATE, SPOTIFY_CODE_URL, INACTIVITY_TIMEOUT
+from api.network import network
+from constants import SLOW_REFRESH_RATE, SPOTIFY_CODE_URL, INACTIVITY_TIMEOUT, PROFILE_CACHE_FILE, \
+    PROFILE_CACHE_SIZE
+from imaging.pool import image_pool
 from model.user import User
 from renderer.renderer import Renderer
-from utils import align_text, Position, Color, load_image_url, get_background_color, is_background_light, rgb_to_hex, \
-    align_image
+from utils import align_text, Position, Color, is_background_light, rgb_to_hex, align_image
 
 
 class Profile(Renderer):
+    """
+    User Profile Renderer
+
+    Arguments:
+        data (api.Data):                Data instance
+
+    Attributes:
+        coords (dict):                  Coordinates dictionary
+        user (model.User):              User instance
+        inactivity (float):             Time playback stopped
+        frame (PIL.Image):              Composited profile screen
+        frame_key (str):                Cache key of the composited profile screen
+    """
     def __init__(self, matrix, canvas, draw, layout, data):
         super().__init__(matrix, canvas, draw, layout)
         self.data: Data = data
         self.coords: dict = self.layout.coords['user']
         self.user: User = self.data.user
         self.inactivity: float = 0
+        self.frame: Image = None
+        self.frame_key: str = None
 
     def render(self):
         self.inactivity = time.time()
-        self.render_background()
-        self.render_name()
-        self.render_code()
-        self.matrix.SetImage(self.canvas)
+        self.user = self.data.user
+        key = self.cache_key()
+        if key != self.frame_key:
+            self.frame = self.load_frame(key)
+            self.frame_key = key
+
+        if self.frame:
+            self.canvas.paste(self.frame)
+        else:
+            self.render_background()
+            self.render_name()
+            if self.render_code():
+                self.save_frame(key)
+        self.commit()
 
         while not self.data.is_playing and not self.timeout():
             time.sleep(SLOW_REFRESH_RATE)
@@ -39,15 +73,24 @@ class Profile(Renderer):
                           Position(self.coords['name']['position']['y']))
         x += self.coords['name']['offset']['x']
         y += self.coords['name']['offset']['y']
-        self.draw.text((x, y), self.user.name, Color.WHITE, self.layout.primary_font)
+        self.layout.primary_font.draw(self.draw, (x, y), self.user.name, Color.WHITE)
 
-    def render_code(self):
-        icon = load_image_url(self.user.icon_url, (64, 64))
-        bg_color = get_background_color(icon)
-        color = 'black' if is_background_light(bg_color) else 'white'
+    def render_code(self) -> bool:
+        """
+        Render the user's Spotify Code over a background matching their icon
+        :return: bool to indicate if the code was rendered
+        """
+        if network.running:
+            code = network.submit(self.load_code()).result()
+        else:
+            icon = image_pool.load_image_url(self.user.icon_url, (64, 64))
+            bg_color = image_pool.get_background_color(icon)
+            color = 'black' if is_background_light(bg_color) else 'white'
 
-        url = SPOTIFY_CODE_URL.format(rgb_to_hex(bg_color), color, self.user.uri)
-        code = load_image_url(url, self.coords['code']['size'])
+            url = SPOTIFY_CODE_URL.format(rgb_to_hex(bg_color), color, self.user.uri)
+            code = image_pool.load_image_url(url, self.coords['code']['size'])
+        if code is None:
+            return False
 
         x, y = align_image(code,
                            self.matrix.width,
@@ -57,6 +100,88 @@ class Profile(Renderer):
         x += self.coords['code']['offset']['x']
         y += self.coords['code']['offset']['y']
         self.canvas.paste(code, (x, y))
+        return True
+
+    async def load_code(self) -> Image:
+        """
+        Download the user icon & a white-on-black Spotify Code concurrently, then recolor the code to match the icon.
+        The code's colors depend on the icon, so fetching it already colored would have to wait for the icon.
+        :return: (PIL.Image) Spotify Code image, None if either download failed
+        """
+        icon, code = await asyncio.gather(network.fetch(self.user.icon_url),
+                                          network.fetch(SPOTIFY_CODE_URL.format('000000', 'white', self.user.uri)),
+                                          return_exceptions=True)
+        if not isinstance(icon, bytes) or not isinstance(code, bytes):
+            logging.error('Could not get user icon or Spotify Code')
+            return None
+        return await asyncio.get_running_loop().run_in_executor(None, self.recolor_code, icon, code)
+
+    def recolor_code(self, icon: bytes, code: bytes) -> Image:
+        """
+        Recolor a white-on-black Spotify Code to use the icon's background color
+        :param icon: (bytes) Encoded user icon
+        :param code: (bytes) Encoded white-on-black Spotify Code
+        :return: (PIL.Image) Spotify Code image
+        """
+        bg_color = image_pool.get_background_color(image_pool.decode_image(icon, (64, 64)))
+        bars = Color.BLACK if is_background_light(bg_color) else Color.WHITE
+        mask = image_pool.decode_image(code, self.coords['code']['size']).convert('L')
+        return Image.composite(Image.new('RGB', mask.size, bars[:3]), Image.new('RGB', mask.size, bg_color[:3]), mask)
+
+    def cache_key(self) -> str:
+        """
+        Key identifying the profile screen, which changes with what's drawn on it: the user's name, icon & URI (for
+        the Spotify Code), and the layout's size, profile coordinates & fonts
+        :return: (str) cache key
+        """
+        fields = {'user': [self.user.id, self.user.name, self.user.icon_url, self.user.uri],
+                  'size': [self.layout.width, self.layout.height],
+                  'coords': self.coords,
+                  'fonts': self.layout.json['fonts']}
+        return hashlib.sha1(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def load_frame(key: str) -> Image:
+        """
+        Load a previously composited profile screen from disk
+        :param key: (str) cache key
+        :return: (PIL.Image) profile screen, None if not cached
+        """
+        filename = PROFILE_CACHE_FILE.format(key)
+        if os.path.isfile(filename):
+            logging.debug(f'Loading profile screen from {filename}')
+            try:
+                os.utime(filename)  # Most recently used are kept when pruning
+                with Image.open(filename) as frame:
+                    return frame.convert('RGB')
+            except OSError:
+                logging.exception(f'Could not load profile screen from {filename}')
+
+    def save_frame(self, key: str):
+        """
+        Keep the composited profile screen in memory & on disk
+        :param key: (str) cache key
+        """
+        self.frame = self.canvas.copy()
+        filename = PROFILE_CACHE_FILE.format(key)
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            self.frame.save(filename)
+        except OSError:
+            logging.exception(f'Could not save profile screen to {filename}')
+        self.prune_frames()
+
+    @staticmethod
+    def prune_frames():
+        """
+        Delete all but the most recently used profile screens from disk
+        """
+        filenames = sorted(glob.glob(PROFILE_CACHE_FILE.format('*')), key=os.path.getmtime, reverse=True)
+        for filename in filenames[PROFILE_CACHE_SIZE:]:
+            try:
+                os.remove(filename)
+            except OSError:
+                logging.exception(f'Could not delete profile screen {filename}')
 
     def timeout(self) -> bool:
         if self.inactivity > 0:
@@ -4,10 +4,14 @@ from typing import Tuple
 
 import multitasking
 from rgbmatrix import RGBMatrix
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 
+from matrix.font import FontStack
+from matrix.history import frame_history
 from matrix.layout import Layout
-from constants import SCROLL_SPEED
+from matrix.pacing import frame_pacer
+from matrix.viewport import Viewport
+from constants import SCROLL_PAUSE
 from utils import Direction
 
 
@@ -36,18 +40,26 @@ class Renderer(ABC):
     def render(self):
         pass
 
+    def commit(self):
+        """
+        Show canvas on the matrix & record it in the frame history (viewports record the whole matrix's frame)
+        """
+        self.matrix.SetImage(self.canvas)
+        if not isinstance(self.matrix, Viewport):
+            frame_history.add(self.canvas)
+
     @multitasking.task
     def scroll_text(self,
                     text: str,
                     text_color: tuple,
-                    font: ImageFont,
+                    font: FontStack,
                     bg_color: tuple,
                     start_pos: Tuple[int, int]):
         """
         Scroll string of text on canvas
         :param text: (str) text to scroll
         :param text_color: (tuple) text font color
-        :param font: (ImageFont) font to render text
+        :param font: (FontStack) fonts to render text
         :param bg_color: (tuple) text background color
         :param start_pos: (int) text starting x-position
         """
@@ -58,9 +70,11 @@ class Renderer(ABC):
         new_direction = True
 
         while self.scrolling is True:
+            start = time.perf_counter()
             self.draw.rectangle((start_pos, end), bg_color)
-            self.draw.text(start_pos, shortened_text, text_color, font)
-            self.matrix.SetImage(self.canvas)
+            font.draw(self.draw, start_pos, shortened_text, text_color)
+            self.commit()
+            elapsed = time.perf_counter() - start
 
             length = font.getsize(shortened_text)[0] + start_pos[0]
 
@@ -79,7 +93,8 @@ class Renderer(ABC):
                 removed_chars.pop()  # Remove from saved characters
 
             if new_direction:
-                time.sleep(2.5)
+                frame_pacer.frame(elapsed)
+                time.sleep(SCROLL_PAUSE)
                 new_direction = False
             else:
-                time.sleep(SCROLL_SPEED)
+                time.sleep(frame_pacer.frame(elapsed))
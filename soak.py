@@ -0,0 +1,313 @@
+import argparse
+import csv
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+from typing import List
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from api.data import Data
+from api.events import TrackChanged
+from constants import SOAK_TRACK_LENGTH, SOAK_ALBUMS, SOAK_SAMPLE_INTERVAL, SOAK_WARMUP, SOAK_TOLERANCE, \
+    SCROLL_SPEED, FRAME_BUDGET, PACING_MAX_TEMPERATURE
+from imaging.cache import art_cache
+from imaging.pool import image_pool
+from matrix.layout import Layout
+from matrix.pacing import frame_pacer, FramePacer, FakeSource
+from renderer.main import MainRenderer
+from utils import palette_cache
+
+real_time = time.time
+real_sleep = time.sleep
+real_wait = threading.Event.wait
+
+
+class ScaledClock:
+    """
+    Run time.time, time.sleep & threading.Event.wait timeouts faster than real time, for every module of the process
+
+    Arguments:
+        speed (float):      Simulated seconds per real second
+    """
+    def __init__(self, speed: float):
+        self.speed: float = speed
+        self.start: float = real_time()
+
+    def time(self) -> float:
+        return self.start + (real_time() - self.start) * self.speed
+
+    def sleep(self, seconds: float):
+        real_sleep(seconds / self.speed)
+
+    def wait(self, event: threading.Event, timeout: float = None) -> bool:
+        return real_wait(event, timeout / self.speed if timeout is not None else None)
+
+    def install(self):
+        time.time = self.time
+        time.sleep = self.sleep
+        clock = self
+        threading.Event.wait = lambda event, timeout=None: clock.wait(event, timeout)
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Serve a distinct PNG image for every path"""
+    def do_GET(self):
+        seed = int.from_bytes(hashlib.sha1(self.path.encode()).digest()[:4], 'little')
+        pixels = np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+        with BytesIO() as buffer:
+            Image.fromarray(pixels, 'RGB').save(buffer, 'PNG')
+            content = buffer.getvalue()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeSpotify:
+    """
+    Spotify stand-in playing an endless sequence of tracks, cycling through a fixed number of albums
+
+    Arguments:
+        image_url (str):    Base URL of the image server
+        clock (ScaledClock):  Clock playback progresses with
+    """
+    def __init__(self, image_url: str, clock: ScaledClock):
+        self.image_url: str = image_url
+        self.clock: ScaledClock = clock
+
+    def track(self, index: int) -> dict:
+        album = index % SOAK_ALBUMS
+        return {
+            'id': f'track{index}',
+            'name': f'Soak Test Track Number {index} With A Long Title',
+            'album': {
+                'type': 'album',
+                'name': f'Album {album}',
+                'artists': [{'name': f'Artist {album}'}],
+                'images': [{'url': f'{self.image_url}/image/album{album}'}],
+            },
+            'duration_ms': SOAK_TRACK_LENGTH * 1000,
+            'uri': f'spotify:track:{index}',
+        }
+
+    def position(self) -> (int, int):
+        elapsed = self.clock.time() - self.clock.start
+        return int(elapsed // SOAK_TRACK_LENGTH), int(elapsed % SOAK_TRACK_LENGTH * 1000)
+
+    def me(self) -> dict:
+        return {'display_name': 'soak',
+                'id': 'soak',
+                'followers': {'total': 0},
+                'images': [{'url': f'{self.image_url}/image/user'}],
+                'uri': 'spotify:user:soak'}
+
+    def current_playback(self) -> dict:
+        index, progress = self.position()
+        return {'is_playing': True,
+                'progress_ms': progress,
+                'device': {'name': 'Soak'},
+                'item': self.track(index)}
+
+    def queue(self) -> dict:
+        index, _ = self.position()
+        return {'queue': [self.track(index + i) for i in range(1, 11)]}
+
+
+class HeadlessMatrix:
+    """
+    RGBMatrix stand-in recording how long the render thread takes to show a new track
+
+    Attributes:
+        render_thread (Thread):     Thread running MainRenderer, scroll threads' frames are ignored
+        changed (float):            Time of the last track change not shown yet
+        latencies (list):           Seconds from track change to new track shown
+    """
+    def __init__(self, width: int, height: int):
+        self.width: int = width
+        self.height: int = height
+        self.render_thread: threading.Thread = None
+        self.changed: float = None
+        self.latencies: List[float] = []
+
+    def on_track_changed(self, _):
+        self.changed = time.perf_counter()
+
+    def SetImage(self, _):
+        if self.changed and threading.current_thread() is self.render_thread:
+            self.latencies.append(time.perf_counter() - self.changed)
+            self.changed = None
+
+    def Clear(self):
+        pass
+
+
+def rss() -> int:
+    """Resident memory of the process, in bytes"""
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def slope(values: List[float]) -> float:
+    """Least squares slope of evenly spaced values"""
+    return float(np.polyfit(np.arange(len(values)), values, 1)[0]) if len(values) > 1 else 0
+
+
+def trending(samples: List[dict]) -> List[str]:
+    """
+    Find metrics trending upwards after warm-up
+    :param samples: (list) Samples, oldest first
+    :return: (list) Failure descriptions, empty if every metric is stable
+    """
+    samples = samples[int(len(samples) * SOAK_WARMUP):]
+    failures = []
+    for metric, tolerance in SOAK_TOLERANCE.items():
+        values = [sample[metric] for sample in samples if sample[metric] is not None]
+        if len(values) < 2:
+            continue
+        growth = slope(values) * (len(values) - 1)  # Over the measured window
+        relative = isinstance(tolerance, float)  # Fraction of the initial value, otherwise absolute
+        limit = tolerance * values[0] if relative else tolerance
+        logging.info(f'{metric}: {values[0]:.4g} -> {values[-1]:.4g}, trend {growth:+.4g} (limit {limit:.4g})')
+        if growth > limit:
+            failures.append(f'{metric} grew by {growth:.4g} (limit {limit:.4g})')
+    return failures
+
+
+def check_pacing() -> List[str]:
+    """
+    Check the frame pacer throttles on heat & slow frames, then recovers once they're gone
+    :return: (list) Failure descriptions, empty if pacing behaves
+    """
+    failures = []
+    pacer = FramePacer(FakeSource(temperature=PACING_MAX_TEMPERATURE + 10))
+    pacer.adjust()
+    if pacer.allow_background() or pacer.interval <= SCROLL_SPEED:
+        failures.append('Frame pacer did not throttle above the maximum temperature')
+
+    pacer.source = FakeSource()
+    pacer.checked = 0  # Readings are stale, nothing is scrolling
+    if not pacer.allow_background():
+        failures.append('Frame pacer kept deferring work after cooling down without any frames')
+
+    for _ in range(5):
+        pacer.frame(FRAME_BUDGET * 2)
+    pacer.adjust()
+    if pacer.allow_background():
+        failures.append('Frame pacer did not throttle on slow frames')
+
+    for _ in range(10):
+        pacer.adjust()
+    if not pacer.allow_background() or pacer.interval != SCROLL_SPEED:
+        failures.append('Frame pacer did not recover the base frame rate')
+    return failures
+
+
+def args() -> argparse.Namespace:
+    """
+    CLI argument parser
+    :return: arguments: (argsparse.Namespace) Argument parser
+    """
+    parser = argparse.ArgumentParser(prog='soak',
+                                     description='Drive the renderers against simulated track changes faster than '
+                                                 'real time & fail if memory, threads, file descriptors or track '
+                                                 'change latency trend upwards.')
+    parser.add_argument('--duration',
+                        help='Real seconds to run for. (Default: 3600)',
+                        type=float,
+                        default=3600)
+    parser.add_argument('--speed',
+                        help='Simulated seconds per real second. (Default: 60)',
+                        type=float,
+                        default=60)
+    parser.add_argument('--width',
+                        help='Matrix width. (Default: 128)',
+                        type=int,
+                        default=128)
+    parser.add_argument('--height',
+                        help='Matrix height. (Default: 64)',
+                        type=int,
+                        default=64)
+    parser.add_argument('--image-pool',
+                        help='Process images in worker processes',
+                        action='store_true')
+    parser.add_argument('--output',
+                        help='CSV file to write samples to')
+    return parser.parse_args()
+
+
+def main() -> int:
+    options = args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+    threading.Thread(target=server.serve_forever, name='image-server', daemon=True).start()
+
+    if options.image_pool:
+        image_pool.start()
+    directory = tempfile.mkdtemp(prefix='soak-')  # Keep fake albums out of the real cache
+    art_cache.directory = os.path.join(directory, 'art')
+    palette_cache.filename = os.path.join(directory, 'palettes.bin')
+
+    clock = ScaledClock(options.speed)
+    clock.install()
+
+    matrix = HeadlessMatrix(options.width, options.height)
+    canvas = Image.new('RGB', (matrix.width, matrix.height))
+    draw = ImageDraw.Draw(canvas)
+    layout = Layout(matrix.width, matrix.height)
+    data = Data(FakeSpotify(f'http://127.0.0.1:{server.server_port}', clock),
+                layout.coords['now_playing']['album_art']['size'])
+    data.subscribe(TrackChanged, matrix.on_track_changed)
+
+    matrix.render_thread = threading.Thread(target=MainRenderer,
+                                            args=(matrix, canvas, draw, layout, data),
+                                            name='render',
+                                            daemon=True)
+    matrix.render_thread.start()
+
+    samples = []
+    end = real_time() + options.duration
+    while real_time() < end:
+        real_sleep(SOAK_SAMPLE_INTERVAL)
+        latencies, matrix.latencies = matrix.latencies, []
+        samples.append({'time': real_time(),
+                        'rss': rss(),
+                        'threads': threading.active_count(),
+                        'fds': len(os.listdir('/proc/self/fd')),
+                        'latency': float(np.mean(latencies)) if latencies else None,
+                        'fps': frame_pacer.metrics.get('fps')})
+        logging.debug(f'Sample: {samples[-1]}')
+
+    if options.output and samples:
+        with open(options.output, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(samples[0]))
+            writer.writeheader()
+            writer.writerows(samples)
+
+    if not samples:
+        logging.warning(f'No samples taken, run for longer than {SOAK_SAMPLE_INTERVAL}s')
+    failures = check_pacing() + trending(samples)
+    for failure in failures:
+        logging.error(failure)
+    logging.info('Soak test failed' if failures else 'Soak test passed')
+
+    image_pool.shutdown()
+    sys.stdout.flush()
+    os._exit(1 if failures else 0)  # Scroll threads never exit on their own
+
+
+if __name__ == '__main__':
+    main()
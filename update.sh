@@ -18,10 +18,22 @@ function installDependencies(){
   sudo pip3 install -r requirements.txt
 }
 
+function installFonts() {
+  printf "\nInstalling fallback fonts...\n"
+  sudo apt-get install fonts-unifont -y
+  if [ ! -f assets/fonts/misaki_gothic.ttf ]; then
+    curl -fsSL -o /tmp/misaki.zip https://littlelimit.net/arc/misaki/misaki_ttf_2021-05-05.zip &&
+      python3 -c "import sys, zipfile; zipfile.ZipFile(sys.argv[1]).extract('misaki_gothic.ttf', sys.argv[2])" \
+        /tmp/misaki.zip assets/fonts
+    rm -f /tmp/misaki.zip
+  fi
+}
+
 function main() {
   clean
   updateRepository
   installDependencies
+  installFonts
 
   chmod +x update.sh
 
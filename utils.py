@@ -1,17 +1,38 @@
 import argparse
+import hashlib
 import json
 import logging
 import math
 import os
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from enum import Enum, auto
 from io import BytesIO
-from typing import Tuple
+from typing import Tuple, TYPE_CHECKING
 
 import numpy as np
 import requests
 from PIL import ImageFont, Image
-from rgbmatrix import RGBMatrixOptions
+from requests.adapters import HTTPAdapter
 from sklearn.cluster import KMeans
+from urllib3.util.retry import Retry
+
+from constants import ANALYSIS_SIZE, PALETTE_CACHE_FILE, PALETTE_CACHE_SIZE, HTTP_RETRIES
+
+if TYPE_CHECKING:  # Only available on the Pi, keeps utils usable on build hosts
+    from rgbmatrix import RGBMatrixOptions
+
+session = requests.Session()  # Shared connection pool for Spotify API & image requests
+# Same retries spotipy sets up on its own sessions, except for 429s, which RateLimiter handles across accounts
+session.mount('https://', HTTPAdapter(max_retries=Retry(total=HTTP_RETRIES,
+                                                        connect=None,
+                                                        read=False,
+                                                        status=HTTP_RETRIES,
+                                                        backoff_factor=0.3,
+                                                        status_forcelist=(500, 502, 503, 504),
+                                                        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']))))
 
 
 class Color:
@@ -35,6 +56,132 @@ class Color:
     LIGHT_SECONDARY = (170, 170, 170, 255)
 
 
+@dataclass(frozen=True)
+class Palette:
+    """Colors to render text over a background"""
+    background: tuple
+    primary: tuple
+    secondary: tuple
+    light: bool
+
+
+class PaletteCache:
+    """
+    Persistent LRU cache of palettes, keyed by a hash of the image's pixels at analysis size, so covers shared by
+    several tracks or URLs are only analyzed once.
+
+    On disk, entries are appended as fixed-size records: 8-byte hash, background, primary & secondary RGB and the
+    light flag. Records are read back on first use, & the file is rewritten least recently used first on shutdown, so
+    recency survives restarts. If the process doesn't shut down cleanly, the file is compacted on the next start when
+    it outgrows the cache, keeping the most recently written palettes.
+
+    Arguments:
+        filename (str):         Cache file
+        max_entries (int):      Maximum number of palettes kept
+
+    Attributes:
+        entries (OrderedDict):  Palette instances by hash, least recently used first
+        loaded (bool):          Boolean to indicate if cache file has been read
+    """
+    RECORD = struct.Struct('<8s3B3B3B?')
+
+    def __init__(self, filename: str = PALETTE_CACHE_FILE, max_entries: int = PALETTE_CACHE_SIZE):
+        self.filename: str = filename
+        self.max_entries: int = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.loaded: bool = False
+        self.lock: threading.RLock = threading.RLock()
+
+    @staticmethod
+    def key(pixels: np.ndarray) -> bytes:
+        """
+        Hash an image's pixels
+        :param pixels: (np.ndarray) RGB pixel buffer at analysis size
+        :return: (bytes) 8-byte hash
+        """
+        return hashlib.blake2b(np.ascontiguousarray(pixels).data, digest_size=8).digest()
+
+    def get(self, key: bytes) -> Palette:
+        """
+        Get cached palette
+        :param key: (bytes) Pixels' hash
+        :return: (Palette) Palette instance, None if not cached
+        """
+        with self.lock:
+            self.load()
+            palette = self.entries.get(key)
+            if palette:
+                self.entries.move_to_end(key)
+            return palette
+
+    def put(self, key: bytes, palette: Palette):
+        """
+        Cache palette, in memory & on disk
+        :param key: (bytes) Pixels' hash
+        :param palette: (Palette) Palette instance
+        """
+        with self.lock:
+            self.load()
+            self.add(key, palette)
+            try:
+                os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+                with open(self.filename, 'ab') as file:
+                    file.write(self.pack(key, palette))
+            except OSError:
+                logging.exception(f'Could not write palette cache {self.filename}')
+
+    def add(self, key: bytes, palette: Palette):
+        self.entries[key] = palette
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def load(self):
+        """
+        Read cached palettes from disk, once
+        """
+        if self.loaded:
+            return
+        self.loaded = True
+        if not os.path.isfile(self.filename):
+            return
+
+        try:
+            with open(self.filename, 'rb') as file:
+                content = file.read()
+        except OSError:
+            logging.exception(f'Could not read palette cache {self.filename}')
+            return
+        records = len(content) // self.RECORD.size
+        for values in self.RECORD.iter_unpack(content[:records * self.RECORD.size]):
+            self.add(values[0], Palette(values[1:4], values[4:7] + (255,), values[7:10] + (255,), values[10]))
+        logging.debug(f'Loaded {len(self.entries)} palettes from {self.filename}')
+
+        if records > len(self.entries):  # Compact duplicates & evicted entries
+            self.save()
+
+    def save(self):
+        """
+        Rewrite the cache file with the cached palettes, least recently used first
+        """
+        with self.lock:
+            if not self.loaded:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+                with open(self.filename, 'wb') as file:
+                    file.write(b''.join(self.pack(key, palette) for key, palette in self.entries.items()))
+            except OSError:
+                logging.exception(f'Could not write palette cache {self.filename}')
+
+    def pack(self, key: bytes, palette: Palette) -> bytes:
+        return self.RECORD.pack(key, *palette.background[:3], *palette.primary[:3], *palette.secondary[:3],
+                                palette.light)
+
+
+palette_cache = PaletteCache()
+
+
 class Direction(Enum):
     LEFT = auto()
     RIGHT = auto()
@@ -116,14 +263,24 @@ def load_image_url(url: str, size: Tuple[int, int]) -> Image:
     :param size: (int, int) Image's maximum width and height
     :return: image: (PIL.Image) Image file
     """
-    response = requests.get(url)
+    response = session.get(url)
     if response.ok:
-        with Image.open(BytesIO(response.content)) as img:
-            img.thumbnail(size)
-            return img.convert('RGB')
+        return decode_image(response.content, size)
     logging.error(f'Could not get image at {url}')
 
 
+def decode_image(content: bytes, size: Tuple[int, int]) -> Image:
+    """
+    Decode encoded image bytes into a resized RGB Image
+    :param content: (bytes) Encoded image (PNG, JPEG, ...)
+    :param size: (int, int) Image's maximum width and height
+    :return: image: (PIL.Image) Image file
+    """
+    with Image.open(BytesIO(content)) as img:
+        img.thumbnail(size)
+        return img.convert('RGB')
+
+
 def rgb_to_hex(rgb: tuple) -> str:
     """
     Convert RGB to HEX
@@ -141,11 +298,28 @@ def get_background_color(img: Image) -> tuple:
     :param img: (PIL.Image) Album cover image
     :return: (tuple) RGB values
     """
-    img = np.asarray(img.resize((100, 100), Image.BILINEAR))
-    img = img.reshape((img.shape[0] * img.shape[1], 3))
+    return dominant_color(image_to_array(img))
+
+
+def image_to_array(img: Image) -> np.ndarray:
+    """
+    Resize image & return its pixel buffer for color analysis
+    :param img: (PIL.Image) Image to analyze
+    :return: (np.ndarray) RGB pixel buffer
+    """
+    return np.asarray(img.resize(ANALYSIS_SIZE, Image.BILINEAR))
+
+
+def dominant_color(pixels: np.ndarray) -> tuple:
+    """
+    Get best matching background color from an RGB pixel buffer
+    :param pixels: (np.ndarray) RGB pixel buffer
+    :return: (tuple) RGB values
+    """
+    pixels = pixels.reshape((pixels.shape[0] * pixels.shape[1], 3))
 
     clt = KMeans(n_clusters=8)
-    clt.fit(img)
+    clt.fit(pixels)
     centroids = clt.cluster_centers_
 
     cf = [colorfulness(color[0], color[1], color[2]) for color in centroids]
@@ -191,6 +365,17 @@ def is_background_light(bg_color: tuple) -> bool:
     return ((bg_color[0] * 0.299) + (bg_color[1] * 0.587) + (bg_color[2] * 0.114)) / 255 > 0.5
 
 
+def get_palette(bg_color: tuple) -> Palette:
+    """
+    Get text colors that stand out over the given background color
+    :param bg_color: (tuple) background color RGB values
+    :return: (Palette) background & text colors
+    """
+    if is_background_light(bg_color):
+        return Palette(bg_color, Color.DARK_PRIMARY, Color.DARK_SECONDARY, True)
+    return Palette(bg_color, Color.LIGHT_PRIMARY, Color.LIGHT_SECONDARY, False)
+
+
 def multiline_text(text: str, max_len: int) -> str:
     """
     Split a string of text into multiple lines based on a max character length value.
@@ -397,13 +582,15 @@ def args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def led_matrix_options(args_: argparse.Namespace) -> RGBMatrixOptions:
+def led_matrix_options(args_: argparse.Namespace) -> 'RGBMatrixOptions':
     """
     Set RGBMatrixOptions from parsed arguments.
     :param args_: (argsparse.Namespace) Parsed arguments from CLI
     :return: options: (rgbmatrix.RGBMatrixOptions) RGBMatrixOptions instance
     :exception AttributeError: If attribute is not found
     """
+    from rgbmatrix import RGBMatrixOptions
+
     options = RGBMatrixOptions()
 
     options.rows = args_.led_rows
@@ -0,0 +1,132 @@
+import argparse
+import glob
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from constants import LAYOUT_FILE, CACHE_DIR, ART_CACHE_DIR, PALETTE_CACHE_FILE
+from imaging.cache import Artwork, artwork_path, write_artwork, image_id
+from utils import read_json, decode_image, get_background_color, get_palette, image_to_array, palette_cache
+
+
+def album_art_urls(fixture) -> List[str]:
+    """
+    Find album art URLs in an API response (track, album, playlist, queue, currently playing, ...)
+    :param fixture: JSON-decoded API response
+    :return: (list) Album art URLs, as used by Data
+    """
+    urls = []
+    if isinstance(fixture, dict):
+        if fixture.get('type') == 'album' and fixture.get('images'):
+            urls.append(fixture['images'][0]['url'])
+        for value in fixture.values():
+            urls += album_art_urls(value)
+    elif isinstance(fixture, list):
+        for value in fixture:
+            urls += album_art_urls(value)
+    return urls
+
+
+def album_art_sizes(layouts: List[str]) -> List[Tuple[int, int]]:
+    """
+    Get album art sizes from layout files
+    :param layouts: (list) Layout files
+    :return: (list) Album art maximum width and height, per layout
+    """
+    return sorted({tuple(read_json(layout)['coords']['now_playing']['album_art']['size']) for layout in layouts})
+
+
+def warm(url: str, filename: str, sizes: List[Tuple[int, int]], directory: str) -> List[tuple]:
+    """
+    Resize image, compute its palette & write it to the cache, for every album art size
+    :param url: (str) URL to image
+    :param filename: (str) Local copy of the image
+    :param sizes: (list) Album art maximum width and height, per layout
+    :param directory: (str) Cache directory
+    :return: (list) (pixels' hash, Palette) of every cache entry written, for the palette cache
+    """
+    with open(filename, 'rb') as file:
+        content = file.read()
+
+    palettes = []
+    for size in sizes:
+        if not os.path.isfile(artwork_path(url, size, directory)):
+            image = decode_image(content, size)
+            palette = get_palette(get_background_color(image))
+            write_artwork(url, size, Artwork(image, palette), directory)
+            palettes.append((palette_cache.key(image_to_array(image)), palette))
+    return palettes
+
+
+def args() -> argparse.Namespace:
+    """
+    CLI argument parser
+    :return: arguments: (argsparse.Namespace) Argument parser
+    """
+    parser = argparse.ArgumentParser(prog='warm_cache',
+                                     description='Pre-warm the album art cache from API response fixtures & a '
+                                                 'directory of images named after their Spotify image id.')
+    parser.add_argument('fixtures',
+                        nargs='+',
+                        help='JSON dumps of API responses (tracks, albums, playlists, ...)')
+    parser.add_argument('--images',
+                        required=True,
+                        help='Directory of album art files, e.g. ab67616d0000b273....jpg')
+    parser.add_argument('--layout',
+                        action='append',
+                        help='Layout size to warm, e.g. 128x64. Can be repeated. (Default: all layouts)')
+    parser.add_argument('--output',
+                        help=f'Cache directory, laid out like {CACHE_DIR} so it can replace it. '
+                             f'(Default: {CACHE_DIR})',
+                        default=CACHE_DIR)
+    parser.add_argument('--workers',
+                        help='Worker processes. (Default: number of cores)',
+                        type=int,
+                        default=os.cpu_count())
+    return parser.parse_args()
+
+
+def main() -> int:
+    options = args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    directory = os.path.join(options.output, os.path.relpath(ART_CACHE_DIR, CACHE_DIR))
+    palette_cache.filename = os.path.join(options.output, os.path.relpath(PALETTE_CACHE_FILE, CACHE_DIR))
+
+    if options.layout:
+        layouts = [LAYOUT_FILE.format(*re.fullmatch(r'(\d+)x(\d+)', size).groups()) for size in options.layout]
+    else:
+        layouts = glob.glob(LAYOUT_FILE.format('*', '*'))
+    sizes = album_art_sizes(layouts)
+
+    urls = []
+    for fixture in options.fixtures:
+        urls += album_art_urls(read_json(fixture))
+    urls = list(dict.fromkeys(urls))  # Unique, in order
+
+    images = {os.path.splitext(name)[0]: os.path.join(options.images, name) for name in os.listdir(options.images)}
+    found = [(url, images[image_id(url)]) for url in urls if image_id(url) in images]
+    for url in urls:
+        if image_id(url) not in images:
+            logging.warning(f'No image file for {url}')
+
+    logging.info(f'Warming {len(found)} image(s) for album art size(s) {sizes} with {options.workers} worker(s)')
+    written = 0
+    with ProcessPoolExecutor(max_workers=options.workers) as executor:
+        for palettes in executor.map(warm,
+                                     [url for url, _ in found],
+                                     [filename for _, filename in found],
+                                     [sizes] * len(found),
+                                     [directory] * len(found)):
+            for key, palette in palettes:
+                palette_cache.put(key, palette)
+            written += len(palettes)
+
+    logging.info(f'Wrote {written} cache entries to {directory} & {palette_cache.filename}')
+    return 0 if len(found) == len(urls) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())